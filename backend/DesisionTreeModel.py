@@ -2,7 +2,8 @@ import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.tree import DecisionTreeClassifier
-import joblib
+from model_registry import publish_model_version
+import training_cache
 
 # Load the training dataset
 def load_training_data(file_path="data/Train_data.csv"):
@@ -16,9 +17,24 @@ def load_training_data(file_path="data/Train_data.csv"):
     """
     return pd.read_csv(file_path)
 
-# Preprocess the data for training
-def preprocess_data(df):
-    """Preprocesses the training data for model training.
+# Columns dropped before training
+columns_to_drop = [
+    'wrong_fragment', 'urgent', 'hot', 'num_failed_logins', 'logged_in', 'num_compromised',
+    'root_shell', 'su_attempted', 'num_root', 'num_file_creations', 'num_shells',
+    'num_access_files', 'num_outbound_cmds', 'is_host_login', 'is_guest_login'
+]
+
+# Everything that shapes the preprocessed matrices; part of the cache key
+PREPROCESSING_CONFIG = {
+    'pipeline': 'DesisionTreeModel',
+    'columns_to_drop': columns_to_drop,
+    'encoding': 'label',
+    'scaler': 'standard',
+}
+
+# Encode and scale the data for training
+def encode_and_scale(df):
+    """Turns the raw training data into a scaled feature matrix and labels.
     
     This function performs several preprocessing steps:
     1. Drops unnecessary columns
@@ -30,34 +46,82 @@ def preprocess_data(df):
         df: DataFrame containing the training data
         
     Returns:
-        Tuple containing (X_train, X_test, y_train, y_test, scaler)
+        Tuple containing (X_scaled, y, scaler, encoders)
     """
     # Drop unnecessary columns
-    columns_to_drop = [
-        'wrong_fragment', 'urgent', 'hot', 'num_failed_logins', 'logged_in', 'num_compromised',
-        'root_shell', 'su_attempted', 'num_root', 'num_file_creations', 'num_shells',
-        'num_access_files', 'num_outbound_cmds', 'is_host_login', 'is_guest_login'
-    ]
     df = df.drop(columns=[col for col in columns_to_drop if col in df.columns], errors='ignore')
     
-    # Encode categorical features
+    # Encode categorical features, keeping each feature's categories for prediction
     label_encoder = LabelEncoder()
+    encoders = {}
     for col in df.columns:
         if df[col].dtype == 'object':
             df[col] = label_encoder.fit_transform(df[col])
+            if col != 'class':
+                encoders[col] = label_encoder.classes_.tolist()
     
     # Split features and target
     X = df.drop('class', axis=1)
-    y = df['class']
+    y = df['class'].to_numpy()
     
     # Scale features
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
     
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.3, random_state=42)
+    return X_scaled, y, scaler, encoders
+
+# Split the preprocessed data
+def split_data(X_scaled, y):
+    """Splits the preprocessed data into training and test sets.
+    
+    Args:
+        X_scaled: Scaled feature matrix
+        y: Labels
+        
+    Returns:
+        Tuple containing (X_train, X_test, y_train, y_test)
+    """
+    return train_test_split(X_scaled, y, test_size=0.3, random_state=42)
+
+# Preprocess the data for training
+def preprocess_data(df):
+    """Preprocesses the training data for model training.
+    
+    Args:
+        df: DataFrame containing the training data
+        
+    Returns:
+        Tuple containing (X_train, X_test, y_train, y_test, scaler, encoders)
+    """
+    X_scaled, y, scaler, encoders = encode_and_scale(df)
+    X_train, X_test, y_train, y_test = split_data(X_scaled, y)
+    return X_train, X_test, y_train, y_test, scaler, encoders
+
+# Load the preprocessed training data, reusing cached matrices
+def load_preprocessed_data(file_path="data/Train_data.csv"):
+    """Loads and preprocesses the training data, skipping both when cached.
+    
+    The scaled matrix, labels, fitted scaler and encoders are cached under
+    the hash of the CSV contents and PREPROCESSING_CONFIG, so a retrain on
+    unchanged data does not parse the CSV at all.
     
-    return X_train, X_test, y_train, y_test, scaler
+    Args:
+        file_path: Path to the training data CSV file
+        
+    Returns:
+        Tuple containing (X_train, X_test, y_train, y_test, scaler, encoders)
+    """
+    key = training_cache.cache_key([file_path], PREPROCESSING_CONFIG)
+    cached = training_cache.load_entry(key)
+    if cached is not None:
+        arrays, artifacts = cached
+        X_scaled, y = arrays['X'], arrays['y']
+        scaler, encoders = artifacts['scaler'], artifacts['encoders']
+    else:
+        X_scaled, y, scaler, encoders = encode_and_scale(load_training_data(file_path))
+        training_cache.save_entry(key, {'X': X_scaled, 'y': y}, {'scaler': scaler, 'encoders': encoders})
+    X_train, X_test, y_train, y_test = split_data(X_scaled, y)
+    return X_train, X_test, y_train, y_test, scaler, encoders
 
 # Train the decision tree model
 def train_model(X_train, y_train):
@@ -75,27 +139,27 @@ def train_model(X_train, y_train):
     return model
 
 # Save the trained model and scaler
-def save_model_and_scaler(model, scaler, model_path="data/decision_tree_model.pkl", scaler_path="data/scaler.pkl"):
-    """Saves the trained model and scaler to disk.
-    
+def save_model_and_scaler(model, scaler, encoders=None, metadata=None):
+    """Publishes the trained model, scaler and encoders as a new model version.
+
+    Artifacts are never overwritten in place; the running detector picks
+    the new version up through the model registry.
+
     Args:
         model: Trained model to save
         scaler: Fitted scaler to save
-        model_path: Path where the model will be saved
-        scaler_path: Path where the scaler will be saved
+        encoders: Dict mapping categorical column names to their categories
+        metadata: Optional dict of extra information stored with the version
+
+    Returns:
+        Name of the published version
     """
-    joblib.dump(model, model_path)
-    joblib.dump(scaler, scaler_path)
-    print(f"Model saved to {model_path}")
-    print(f"Scaler saved to {scaler_path}")
+    return publish_model_version(model, scaler, encoders, metadata)
 
 # Main execution
 if __name__ == "__main__":
-    # Load data
-    train_data = load_training_data()
-    
-    # Preprocess data
-    X_train, X_test, y_train, y_test, scaler = preprocess_data(train_data)
+    # Load and preprocess data (from the cache when the data is unchanged)
+    X_train, X_test, y_train, y_test, scaler, encoders = load_preprocessed_data()
     
     # Train model
     model = train_model(X_train, y_train)
@@ -105,4 +169,4 @@ if __name__ == "__main__":
     print(f"Model accuracy: {accuracy:.4f}")
     
     # Save model and scaler
-    save_model_and_scaler(model, scaler)
\ No newline at end of file
+    save_model_and_scaler(model, scaler, encoders, {'source': 'data/Train_data.csv', 'accuracy': accuracy})
\ No newline at end of file
@@ -1,9 +1,25 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import subprocess
 import pandas as pd
 import os
+import json
+import zlib
+import itertools
+import time
 import threading
+import model_registry
+import host_state
+import backpressure
+import sampling_profiler
+from prediction_history import PredictionHistory
+import predict_new
+
+# Brotli is optional; without it /logs only offers gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Initialize Flask application
 app = Flask(__name__)
@@ -12,6 +28,36 @@ CORS(app) # Enable CORS for all routes
 # Define directory paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
+MODELS_DIR = os.path.join(DATA_DIR, 'models')
+PIPELINE_STATS_FILE = os.path.join(DATA_DIR, 'pipeline_stats.json')
+PROFILE_DIR = os.path.join(DATA_DIR, 'profiles')
+CAPTURE_STOP_FILE = os.path.join(DATA_DIR, 'capture.stop')  # Polled by t18.py, see t18.STOP_FILE
+
+# Capture settings and overload handling for each detection cycle
+CAPTURE_DURATION = 10  # Seconds of capture per cycle
+CAPTURE_TIMEOUT = 60  # Seconds before the capture script is stopped
+CAPTURE_STOP_GRACE = 10  # Seconds a stopped capture gets to save before it is killed
+OVERLOAD_POLICY = backpressure.DROP_OLDEST  # drop_oldest, flow_sample or header_only
+INFERENCE_MAX_ROWS = 20000  # Rows scored per cycle before load shedding
+
+# Overload counters: the last detection cycle and the running totals
+last_cycle_stats = {}
+pipeline_totals = backpressure.OverloadStats()
+
+# Running capture process (if any), for on-demand profiling
+capture_process = None
+
+# Longest profile the admin endpoint will take, and one profile at a time
+MAX_PROFILE_SECONDS = 60
+profile_lock = threading.Lock()
+
+# Model bundle shared by every detection cycle, hot-swapped when a new version is activated
+model_watcher = None
+model_watcher_lock = threading.Lock()
+
+# Raw prediction history and its per-minute/per-hour rollups
+prediction_history = None
+prediction_history_lock = threading.Lock()
 
 # --- Helper Functions ---
 def run_script(script_name, args=[]):
@@ -36,69 +82,280 @@ def run_script(script_name, args=[]):
         print(f"Error running script {script_name}: {e}")
         return None
 
+def get_model_watcher():
+    """Returns the shared ModelWatcher, creating and starting it on first use.
+
+    Returns:
+        model_registry.ModelWatcher tracking the active model version
+    """
+    global model_watcher
+    with model_watcher_lock:
+        if model_watcher is None:
+            model_watcher = model_registry.ModelWatcher(MODELS_DIR)
+            model_watcher.start()
+    return model_watcher
+
+def get_prediction_history():
+    """Returns the shared PredictionHistory, opening it on first use.
+
+    Returns:
+        PredictionHistory backed by data/predictions.db
+    """
+    global prediction_history
+    with prediction_history_lock:
+        if prediction_history is None:
+            if not os.path.exists(DATA_DIR):
+                os.makedirs(DATA_DIR)
+            prediction_history = PredictionHistory(os.path.join(DATA_DIR, 'predictions.db'))
+    return prediction_history
+
+def parse_time_arg(value, default):
+    """Parses a time query parameter given as epoch seconds or ISO 8601.
+
+    Args:
+        value: Raw query parameter value, or None
+        default: Value returned when the parameter is absent
+
+    Returns:
+        Time in epoch seconds
+
+    Raises:
+        ValueError: If the value cannot be parsed
+    """
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return pd.Timestamp(value).timestamp()
+
 # --- API Endpoints ---
 
 @app.route('/trigger-detection', methods=['POST'])
 def trigger_detection():
     """Triggers the live packet capture and prediction scripts.
     
-    This endpoint runs t18.py to capture network packets and then predict_new.py
-    to analyze the captured data for potential intrusions.
+    This endpoint runs t18.py to capture network packets and then scores the
+    captured data in-process with predict_new, using the currently active
+    model version (and the shadow version, if one is selected).
+    
+    Overload is handled rather than fatal: stages shed load according to
+    OVERLOAD_POLICY, and if capture overruns CAPTURE_TIMEOUT it is asked to
+    stop and whatever it saved is still scored.
     
     Returns:
         JSON response with status and message
     """
+    global last_cycle_stats, capture_process
     print("Attempting to trigger detection...")
+    cycle_start = time.time()
+    cycle_stats = backpressure.OverloadStats()
+    live_data_path = os.path.join(DATA_DIR, 'live_data.csv')
+    partial = False
+
     # 1. Run t18.py to capture live data
-    t18_process = run_script('t18.py')
+    t18_process = run_script('t18.py', [str(CAPTURE_DURATION), OVERLOAD_POLICY])
+    capture_process = t18_process
     if t18_process:
         try:
-            t18_stdout, t18_stderr = t18_process.communicate(timeout=60) # Wait for t18.py to finish with a 60s timeout
+            t18_stdout, t18_stderr = t18_process.communicate(timeout=CAPTURE_TIMEOUT) # Wait for t18.py to finish
             print(f"t18.py stdout: {t18_stdout}")
             if t18_stderr:
                 print(f"t18.py stderr: {t18_stderr}")
-            # Check if live_data.csv was created
-            live_data_path = os.path.join(DATA_DIR, 'live_data.csv')
-            if not os.path.exists(live_data_path):
-                print(f"Error: {live_data_path} not found after t18.py execution.")
-                return jsonify({'status': 'error', 'message': 'Packet capture script did not produce live_data.csv.'}), 500
-            print(f"t18.py finished, {live_data_path} should exist.")
         except subprocess.TimeoutExpired:
-            t18_process.kill()
-            t18_stdout, t18_stderr = t18_process.communicate() # to get any output
+            # Ask t18.py to stop and save what it has extracted; kill it only if it does not comply.
+            # A stop file works on every platform, unlike terminate() which skips cleanup on Windows.
+            with open(CAPTURE_STOP_FILE, 'w') as f:
+                f.write(str(t18_process.pid))
+            try:
+                t18_stdout, t18_stderr = t18_process.communicate(timeout=CAPTURE_STOP_GRACE)
+            except subprocess.TimeoutExpired:
+                t18_process.kill()
+                t18_stdout, t18_stderr = t18_process.communicate() # to get any output
+            finally:
+                if os.path.exists(CAPTURE_STOP_FILE):
+                    os.remove(CAPTURE_STOP_FILE)
             print(f"t18.py timed out. stdout: {t18_stdout}, stderr: {t18_stderr}")
-            return jsonify({'status': 'error', 'message': 'Packet capture script timed out after 60 seconds.'}), 500
+            partial = True
         except Exception as e: # Catch other potential errors during communicate
             print(f"Error communicating with t18.py: {e}")
             return jsonify({'status': 'error', 'message': f'Error during packet capture: {str(e)}'}), 500
     else:
         return jsonify({'status': 'error', 'message': 'Failed to start packet capture script.'}), 500
 
-    # 2. Run predict_new.py to process live_data.csv
-    predict_process = run_script('predict_new.py')
-    if predict_process:
-        try:
-            predict_stdout, predict_stderr = predict_process.communicate(timeout=60) # Wait for predict_new.py with a 60s timeout
-            print(f"predict_new.py stdout: {predict_stdout}")
-            if predict_stderr:
-                print(f"predict_new.py stderr: {predict_stderr}")
-            # Check if live_predictions.csv was created
-            live_predictions_path = os.path.join(DATA_DIR, 'live_predictions.csv')
-            if not os.path.exists(live_predictions_path):
-                print(f"Error: {live_predictions_path} not found after predict_new.py execution.")
-                return jsonify({'status': 'error', 'message': 'Prediction script did not produce live_predictions.csv.'}), 500
-            print(f"predict_new.py finished, {live_predictions_path} should exist.")
-            return jsonify({'status': 'success', 'message': 'Detection cycle completed. Check logs for results.', 'output': predict_stdout}), 200
-        except subprocess.TimeoutExpired:
-            predict_process.kill()
-            predict_stdout, predict_stderr = predict_process.communicate() # to get any output
-            print(f"predict_new.py timed out. stdout: {predict_stdout}, stderr: {predict_stderr}")
-            return jsonify({'status': 'error', 'message': 'Prediction script timed out after 60 seconds.'}), 500
-        except Exception as e: # Catch other potential errors during communicate
-            print(f"Error communicating with predict_new.py: {e}")
-            return jsonify({'status': 'error', 'message': f'Error during prediction: {str(e)}'}), 500
-    else:
-        return jsonify({'status': 'error', 'message': 'Failed to start prediction script.'}), 500
+    # Check that live_data.csv was written by this cycle
+    if not os.path.exists(live_data_path) or os.path.getmtime(live_data_path) < cycle_start:
+        print(f"Error: {live_data_path} not produced by this t18.py run.")
+        if partial:
+            return jsonify({'status': 'error', 'message': f'Packet capture script timed out after {CAPTURE_TIMEOUT} seconds without saving data.'}), 500
+        return jsonify({'status': 'error', 'message': 'Packet capture script did not produce live_data.csv.'}), 500
+    if os.path.exists(PIPELINE_STATS_FILE) and os.path.getmtime(PIPELINE_STATS_FILE) >= cycle_start:
+        cycle_stats.merge(backpressure.load_stats(PIPELINE_STATS_FILE))
+    print(f"t18.py finished, {live_data_path} should exist.")
+
+    # 2. Score live_data.csv in-process with the currently active model version
+    try:
+        live_predictions_path = os.path.join(DATA_DIR, 'live_predictions.csv')
+        predict_output = predict_new.run_detection(
+            get_model_watcher(), live_data_path, live_predictions_path, history=get_prediction_history(),
+            max_rows=INFERENCE_MAX_ROWS, policy=OVERLOAD_POLICY, stats=cycle_stats
+        )
+        print(f"Prediction output: {predict_output}")
+    except Exception as e:
+        print(f"Error during prediction: {e}")
+        return jsonify({'status': 'error', 'message': f'Error during prediction: {str(e)}'}), 500
+    finally:
+        last_cycle_stats = cycle_stats.snapshot()
+        pipeline_totals.merge(last_cycle_stats)
+
+    message = 'Detection cycle completed. Check logs for results.'
+    if partial:
+        message = 'Detection cycle completed on partial capture (capture timed out). Check logs for results.'
+    return jsonify({'status': 'success', 'message': message, 'output': predict_output, 'overload': last_cycle_stats}), 200
+
+@app.route('/pipeline-stats', methods=['GET'])
+def get_pipeline_stats():
+    """Returns the overload counters of the detection pipeline.
+
+    Counters are grouped by stage (capture, extraction, inference) and
+    name the policy action taken: accepted, dropped_oldest, sampled_out,
+    degraded, dropped_full or dropped_deadline.
+
+    Returns:
+        JSON response with the last cycle's counters and the running totals
+    """
+    return jsonify({
+        'policy': OVERLOAD_POLICY,
+        'last_cycle': last_cycle_stats,
+        'totals': pipeline_totals.snapshot()
+    }), 200
+
+@app.route('/admin/profile', methods=['POST'])
+def profile_detector():
+    """Profiles the running detection pipeline without restarting it.
+
+    Samples the backend process (inference and preprocessing in
+    predict_new, model watcher, API threads) and, if a capture is running,
+    the t18.py process (capture and feature extraction, including
+    process_packet) for the requested duration.
+
+    Query parameters:
+        seconds: Profile duration (default 10, at most MAX_PROFILE_SECONDS)
+        format: 'json' (default) for hot spots and collapsed stacks per
+            process, or 'collapsed' for a single flamegraph-ready text profile
+
+    Returns:
+        Profile response, or error message
+    """
+    try:
+        seconds = float(request.args.get('seconds', 10))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'seconds must be a number.'}), 400
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return jsonify({'status': 'error', 'message': f'seconds must be between 0 and {MAX_PROFILE_SECONDS}.'}), 400
+    output_format = request.args.get('format', 'json')
+    if output_format not in ('json', 'collapsed'):
+        return jsonify({'status': 'error', 'message': "format must be 'json' or 'collapsed'."}), 400
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({'status': 'error', 'message': 'A profile is already being taken.'}), 409
+
+    try:
+        process = capture_process
+        capture_pid = process.pid if process is not None and process.poll() is None else None
+        if capture_pid is not None:
+            sampling_profiler.request_profile(capture_pid, seconds, PROFILE_DIR)
+        profiles = {'app': sampling_profiler.profile_for(seconds)}
+        if capture_pid is not None:
+            # The capture may end early; it then reports what it sampled
+            capture_profile = sampling_profiler.wait_for_profile(capture_pid, 5, PROFILE_DIR)
+            if capture_profile is not None:
+                profiles['t18'] = capture_profile
+    except Exception as e:
+        print(f"Error profiling detector: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        profile_lock.release()
+
+    if output_format == 'collapsed':
+        lines = [
+            f"{name};{line}"
+            for name, profile in profiles.items()
+            for line in profile['collapsed'].splitlines()
+        ]
+        return Response("\n".join(lines) + "\n", mimetype='text/plain'), 200
+    return jsonify({'seconds': seconds, 'profiles': profiles}), 200
+
+@app.route('/model', methods=['GET'])
+def get_model_status():
+    """Returns the active and shadow model versions.
+
+    Includes the shadow-scoring report (disagreement rate and latency delta
+    against the active model) when a candidate is being evaluated.
+
+    Returns:
+        JSON response with model version information
+    """
+    try:
+        watcher = get_model_watcher()
+        shadow = watcher.shadow()
+        return jsonify({
+            'active_version': watcher.current().version,
+            'shadow_version': shadow.version if shadow else None,
+            'versions': model_registry.list_versions(MODELS_DIR),
+            'shadow_report': watcher.shadow_report()
+        }), 200
+    except Exception as e:
+        print(f"Error reading model status: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/model/shadow', methods=['POST'])
+def set_shadow_model():
+    """Selects the candidate version scored in shadow mode.
+
+    Expects a JSON body {"version": "<version>"}; a null version disables
+    shadow mode.
+
+    Returns:
+        JSON response with status and message
+    """
+    version = (request.get_json(silent=True) or {}).get('version')
+    try:
+        model_registry.set_shadow_version(version, MODELS_DIR)
+        get_model_watcher().refresh()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error setting shadow model: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    message = f'Shadow scoring with version {version}.' if version else 'Shadow scoring disabled.'
+    return jsonify({'status': 'success', 'message': message}), 200
+
+@app.route('/model/promote', methods=['POST'])
+def promote_model():
+    """Promotes a version (the shadow version by default) to active.
+
+    Accepts an optional JSON body {"version": "<version>"}. The swap takes
+    effect for the next scored batch without restarting the detector.
+
+    Returns:
+        JSON response with status and message
+    """
+    watcher = get_model_watcher()
+    shadow = watcher.shadow()
+    version = (request.get_json(silent=True) or {}).get('version') or (shadow.version if shadow else None)
+    if not version:
+        return jsonify({'status': 'error', 'message': 'No version given and no shadow model selected.'}), 400
+    try:
+        model_registry.set_active_version(version, MODELS_DIR)
+        if shadow and shadow.version == version:
+            model_registry.set_shadow_version(None, MODELS_DIR)
+        watcher.refresh()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error promoting model: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    return jsonify({'status': 'success', 'message': f'Version {version} is now active.'}), 200
 
 @app.route('/latest-alert', methods=['GET'])
 def get_latest_alert():
@@ -135,38 +392,213 @@ def get_latest_alert():
         print(f"Error reading latest alert: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# Map dashboard severities to predicted classes
+SEVERITY_CLASSES = {'High': 1, 'Medium': -1, 'Low': 0}
+
+# Fields a /logs entry can be projected to
+LOG_FIELDS = ['id', 'timestamp', 'type', 'severity', 'source_ip', 'dst_ip', 'src_port', 'dst_port', 'intrusion_prob', 'predicted_class', 'details']
+DEFAULT_LOG_FIELDS = ['id', 'timestamp', 'type', 'severity', 'source_ip', 'details']
+
+# Default and maximum number of rows returned by /logs
+DEFAULT_LOG_LIMIT = 1000
+MAX_LOG_LIMIT = 100000
+
+def format_log(row, fields):
+    """Formats one stored prediction as a frontend log entry.
+
+    Args:
+        row: Dict from PredictionHistory.iter_predictions
+        fields: List of LOG_FIELDS to include
+
+    Returns:
+        Dict with the requested fields
+    """
+    predicted_class = row['predicted_class']
+    log = {
+        'id': str(row['id']),
+        'timestamp': pd.Timestamp(row['ts'], unit='s', tz='UTC').isoformat(),
+        'type': 'Anomaly' if predicted_class == 1 else ('Uncertain' if predicted_class == -1 else 'Normal'),
+        'severity': 'High' if predicted_class == 1 else ('Medium' if predicted_class == -1 else 'Low'),
+        'source_ip': row['src_ip'] or 'N/A',
+        'dst_ip': row['dst_ip'],
+        'src_port': row['src_port'],
+        'dst_port': row['dst_port'],
+        'intrusion_prob': row['intrusion_prob'],
+        'predicted_class': predicted_class,
+        'details': f"Prob: {row['intrusion_prob']:.2f}, Raw Class: {predicted_class}"
+    }
+    return {field: log[field] for field in fields}
+
+def stream_json_array(items):
+    """Serializes an iterable as a JSON array, one element at a time.
+
+    Args:
+        items: Iterable of JSON-serializable objects
+
+    Yields:
+        Byte chunks of the JSON document
+    """
+    yield b'['
+    first = True
+    for item in items:
+        yield (b'' if first else b',') + json.dumps(item).encode()
+        first = False
+    yield b']'
+
+def compress_stream(chunks, encoding):
+    """Compresses a byte stream incrementally.
+
+    Args:
+        chunks: Iterable of byte chunks
+        encoding: 'br', 'gzip' or None for no compression
+
+    Yields:
+        Compressed byte chunks
+    """
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 produces a gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
 @app.route('/logs', methods=['GET'])
 def get_logs():
-    """Returns historical logs (content of live_predictions.csv for now).
+    """Returns historical logs from the prediction history, newest first.
     
-    This endpoint reads all entries from live_predictions.csv and formats them
-    as logs for the frontend.
+    Query parameters:
+        severity: Comma-separated severities to keep (High, Medium, Low)
+        source_ip: Source IP to match
+        dst_port: Destination port to match
+        from: Range start, epoch seconds or ISO 8601
+        to: Range end, epoch seconds or ISO 8601
+        fields: Comma-separated fields to return (default: the dashboard fields)
+        limit: Maximum number of entries, 1 to 100000 (default 1000)
+    
+    Filters run in SQLite against indexed columns, and the response is
+    streamed and compressed with br or gzip when the client accepts it.
     
     Returns:
         JSON response with logs array or error message
     """
-    live_predictions_path = os.path.join(DATA_DIR, 'live_predictions.csv')
     try:
-        if os.path.exists(live_predictions_path):
-            df = pd.read_csv(live_predictions_path)
-            # Transform data for frontend if necessary
-            logs = []
-            for index, row in df.iterrows():
-                logs.append({
-                    'id': str(index), # Use index as ID
-                    'timestamp': pd.Timestamp.now().isoformat(), # Placeholder, ideally from data
-                    'type': 'Anomaly' if row.get('predicted_class') == 1 else ('Uncertain' if row.get('predicted_class') == -1 else 'Normal'),
-                    'severity': 'High' if row.get('predicted_class') == 1 else ('Medium' if row.get('predicted_class') == -1 else 'Low'),
-                    'source_ip': row.get('src_ip', 'N/A'),
-                    'details': f"Prob: {row.get('intrusion_prob', 0):.2f}, Raw Class: {row.get('predicted_class')}"
-                })
-            return jsonify(logs), 200
-        else:
-            return jsonify([]), 200 # Return empty list if no logs
+        classes = None
+        if request.args.get('severity'):
+            severities = [value.strip().capitalize() for value in request.args['severity'].split(',')]
+            unknown = [value for value in severities if value not in SEVERITY_CLASSES]
+            if unknown:
+                raise ValueError(f"Unknown severity: {', '.join(unknown)}. Use High, Medium or Low.")
+            classes = [SEVERITY_CLASSES[value] for value in severities]
+
+        fields = DEFAULT_LOG_FIELDS
+        if request.args.get('fields'):
+            fields = [value.strip() for value in request.args['fields'].split(',')]
+            unknown = [value for value in fields if value not in LOG_FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown field: {', '.join(unknown)}. Use any of {', '.join(LOG_FIELDS)}.")
+
+        dst_port = request.args.get('dst_port')
+        dst_port = int(dst_port) if dst_port else None
+        limit = int(request.args.get('limit', DEFAULT_LOG_LIMIT))
+        if limit < 1:
+            raise ValueError("limit must be a positive integer.")
+        limit = min(limit, MAX_LOG_LIMIT)
+        start = parse_time_arg(request.args.get('from'), None)
+        end = parse_time_arg(request.args.get('to'), None)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    try:
+        rows = get_prediction_history().iter_predictions(
+            start=start, end=end, classes=classes, src_ip=request.args.get('source_ip') or None,
+            dst_port=dst_port, limit=limit
+        )
+        # Pull the first row now so that database errors surface as a 500, not a broken stream
+        first = next(rows, None)
+        logs = (format_log(row, fields) for row in itertools.chain([first] if first is not None else [], rows))
     except Exception as e:
         print(f"Error reading logs: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = request.accept_encodings.best_match(offered)
+    response = Response(stream_with_context(compress_stream(stream_json_array(logs), encoding)), mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response, 200
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """Returns time-bucketed prediction statistics for dashboard charts.
+
+    Query parameters:
+        from: Range start, epoch seconds or ISO 8601 (default: one hour ago)
+        to: Range end, epoch seconds or ISO 8601 (default: now)
+        resolution: 'minute' (default) or 'hour'
+
+    Answered from the rollups, so the cost does not grow with the number
+    of recorded predictions.
+
+    Returns:
+        JSON response with the buckets array or error message
+    """
+    now = pd.Timestamp.now(tz='UTC').timestamp()
+    resolution = request.args.get('resolution', 'minute')
+    try:
+        end = parse_time_arg(request.args.get('to'), now)
+        start = parse_time_arg(request.args.get('from'), end - 3600)
+        buckets = get_prediction_history().stats(start, end, resolution)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error reading stats: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    for bucket in buckets:
+        bucket['timestamp'] = pd.Timestamp(bucket['bucket'], unit='s', tz='UTC').isoformat()
+    return jsonify({'from': start, 'to': end, 'resolution': resolution, 'buckets': buckets}), 200
+
+@app.route('/top-talkers', methods=['GET'])
+def get_top_talkers():
+    """Returns the heaviest hosts from the per-host state index.
+
+    Query parameters:
+        direction: 'src' for senders (default) or 'dst' for receivers
+        limit: Maximum number of hosts (default 10)
+
+    Each host includes its packet count, distinct peers, distinct destination
+    ports and error rates over the sliding window, as maintained by t18.py.
+
+    Returns:
+        JSON response with the hosts array or error message
+    """
+    direction = request.args.get('direction', 'src')
+    if direction not in ('src', 'dst'):
+        return jsonify({'status': 'error', 'message': "direction must be 'src' or 'dst'."}), 400
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit must be an integer.'}), 400
+    if limit < 1:
+        return jsonify({'status': 'error', 'message': 'limit must be a positive integer.'}), 400
+    try:
+        index = host_state.load_state(os.path.join(DATA_DIR, 'host_state.pkl'))
+        return jsonify(index.top_talkers(direction, limit)), 200
+    except Exception as e:
+        print(f"Error reading host state: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 if __name__ == '__main__':
     # Ensure data directory exists
     if not os.path.exists(DATA_DIR):
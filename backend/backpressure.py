@@ -0,0 +1,297 @@
+import json
+import os
+import hashlib
+import threading
+from collections import deque
+import numpy as np
+
+# Overload policies applied when a stage's queue fills up
+DROP_OLDEST = "drop_oldest"
+FLOW_SAMPLE = "flow_sample"
+HEADER_ONLY = "header_only"
+POLICIES = (DROP_OLDEST, FLOW_SAMPLE, HEADER_ONLY)
+
+# Fill ratio above which sampling and degradation start
+HIGH_WATERMARK = 0.75
+
+# Define the file where the capture script publishes its counters
+STATS_FILE = "data/pipeline_stats.json"
+
+# Columns identifying a flow in captured and extracted records
+FLOW_COLUMNS = ("src_ip", "dst_ip", "src_port", "dst_port")
+
+# Identify the flow of a packet or record
+def flow_key(src_ip, dst_ip, src_port, dst_port):
+    """Builds the canonical key of a flow.
+
+    Capture (from packet headers) and inference (from record columns) must
+    build identical keys, so that a flow kept whole by one stage is not cut
+    by the next; ports are normalized to plain ints for that reason.
+
+    Args:
+        src_ip: Source IP address
+        dst_ip: Destination IP address
+        src_port: Source port (0 for protocols without ports)
+        dst_port: Destination port (0 for protocols without ports)
+
+    Returns:
+        String key
+    """
+    return f"{src_ip}|{dst_ip}|{int(src_port)}|{int(dst_port)}"
+
+# Map a flow to a stable point in [0, 1)
+def flow_position(key):
+    """Hashes a flow key to a stable value in [0, 1).
+
+    Every packet of a flow maps to the same value, so comparing it with a
+    keep ratio samples whole flows rather than individual packets.
+
+    Args:
+        key: Key returned by flow_key, or None for packets without a flow
+
+    Returns:
+        Float in [0, 1)
+    """
+    digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2 ** 64
+
+# Map every row of a batch to its flow's point in [0, 1)
+def flow_positions(df):
+    """Computes flow_position for every row of a DataFrame.
+
+    Keys are built column-wise rather than with a row-wise apply, since
+    this runs when the pipeline is already overloaded. Missing flow
+    columns count as empty addresses and port 0.
+
+    Args:
+        df: DataFrame with the FLOW_COLUMNS
+
+    Returns:
+        Numpy float array aligned with df's rows
+    """
+    columns = []
+    for col in FLOW_COLUMNS:
+        if col not in df.columns:
+            columns.append([0 if col.endswith("_port") else ""] * len(df))
+        elif col.endswith("_port"):
+            columns.append(df[col].fillna(0).astype("int64").tolist())
+        else:
+            columns.append(df[col].fillna("").astype(str).tolist())
+    return np.fromiter(
+        (flow_position(flow_key(*values)) for values in zip(*columns)),
+        dtype=np.float64,
+        count=len(df),
+    )
+
+# Fraction of flows kept at a given fill level
+def keep_ratio(fill):
+    """Returns the share of flows admitted at a given queue fill ratio.
+
+    All flows are kept below HIGH_WATERMARK; above it the share falls
+    linearly to zero when the queue is full.
+
+    Args:
+        fill: Queue length divided by capacity
+
+    Returns:
+        Float in [0, 1]
+    """
+    if fill <= HIGH_WATERMARK:
+        return 1.0
+    return max(0.0, (1.0 - fill) / (1.0 - HIGH_WATERMARK))
+
+class OverloadStats:
+    """Thread-safe per-stage, per-policy drop counters."""
+
+    def __init__(self):
+        """Starts every counter at zero."""
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def increment(self, stage, counter, amount=1):
+        """Adds amount to a stage's counter.
+
+        Args:
+            stage: Pipeline stage name (capture, extraction, inference)
+            counter: Counter name (accepted, dropped_oldest, sampled_out...)
+            amount: Value to add
+        """
+        if not amount:
+            return
+        with self._lock:
+            counters = self._counters.setdefault(stage, {})
+            counters[counter] = counters.get(counter, 0) + amount
+
+    def merge(self, snapshot):
+        """Adds the counters of another snapshot to this one.
+
+        Args:
+            snapshot: Dict as returned by snapshot()
+        """
+        for stage, counters in snapshot.items():
+            for counter, amount in counters.items():
+                self.increment(stage, counter, amount)
+
+    def snapshot(self):
+        """Returns a copy of the counters as {stage: {counter: value}}."""
+        with self._lock:
+            return {stage: dict(counters) for stage, counters in self._counters.items()}
+
+class BoundedQueue:
+    """Bounded hand-off between two pipeline stages with an overload policy.
+
+    Producers never block. When the consumer falls behind, the policy
+    decides what to shed:
+
+    - drop_oldest: a full queue evicts its oldest item for the new one.
+    - flow_sample: above the high watermark, only a shrinking share of
+      flows is admitted, chosen by flow hash so sampled flows stay complete.
+    - header_only: above the high watermark, items are admitted but
+      flagged as degraded so the consumer skips expensive features.
+
+    Under flow_sample and header_only a full queue rejects new items.
+    """
+
+    def __init__(self, maxsize, policy=DROP_OLDEST, stage="capture", stats=None):
+        """Creates an empty queue.
+
+        Args:
+            maxsize: Maximum number of queued items
+            policy: One of POLICIES
+            stage: Stage name used for the counters
+            stats: Shared OverloadStats; a private one is created if omitted
+
+        Raises:
+            ValueError: If the policy is unknown
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overload policy: {policy}. Use one of {', '.join(POLICIES)}.")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.stage = stage
+        self.stats = stats if stats is not None else OverloadStats()
+        self._items = deque()
+        self._not_empty = threading.Condition()
+
+    def __len__(self):
+        """Returns the number of queued items."""
+        with self._not_empty:
+            return len(self._items)
+
+    def put(self, item, flow_key=None):
+        """Offers an item to the queue without blocking.
+
+        Args:
+            item: Item to enqueue
+            flow_key: Key returned by flow_key, used by the flow_sample policy
+
+        Returns:
+            True if the item was queued, False if it was shed
+        """
+        with self._not_empty:
+            fill = len(self._items) / self.maxsize
+            degraded = False
+            if self.policy == FLOW_SAMPLE and fill > HIGH_WATERMARK:
+                if flow_position(flow_key) >= keep_ratio(fill):
+                    self.stats.increment(self.stage, "sampled_out")
+                    return False
+            elif self.policy == HEADER_ONLY and fill > HIGH_WATERMARK:
+                degraded = True
+
+            if len(self._items) >= self.maxsize:
+                if self.policy != DROP_OLDEST:
+                    self.stats.increment(self.stage, "dropped_full")
+                    return False
+                self._items.popleft()
+                self.stats.increment(self.stage, "dropped_oldest")
+
+            if degraded:
+                self.stats.increment(self.stage, "degraded")
+            self._items.append((item, degraded))
+            self.stats.increment(self.stage, "accepted")
+            self._not_empty.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Removes the oldest item, waiting up to timeout seconds for one.
+
+        Args:
+            timeout: Seconds to wait, or None to wait forever
+
+        Returns:
+            Tuple (item, degraded), or None if the wait timed out
+        """
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._items, timeout):
+                return None
+            return self._items.popleft()
+
+    def drain(self):
+        """Removes and returns every queued (item, degraded) pair."""
+        with self._not_empty:
+            items = list(self._items)
+            self._items.clear()
+            return items
+
+# Shed rows of a batch that exceeds the inference budget
+def shed_rows(df, max_rows, policy, stats=None, stage="inference"):
+    """Reduces a batch to at most max_rows according to an overload policy.
+
+    drop_oldest keeps the newest rows; flow_sample keeps whole flows
+    chosen by the same flow hash as the capture queue, so a flow the
+    capture stage kept whole is kept or dropped as a whole here;
+    header_only has no cheaper scoring path at this stage, so it keeps the
+    newest rows like drop_oldest.
+
+    Args:
+        df: DataFrame of captured rows, oldest first
+        max_rows: Maximum rows to keep
+        policy: One of POLICIES
+        stats: Optional OverloadStats receiving the shed count
+        stage: Stage name used for the counters
+
+    Returns:
+        DataFrame with at most max_rows rows
+    """
+    if len(df) <= max_rows:
+        return df
+    if policy == FLOW_SAMPLE:
+        kept = df[flow_positions(df) < max_rows / len(df)]
+        # Hash sampling is approximate; trim any remainder from the oldest end
+        kept = kept.tail(max_rows)
+        counter = "sampled_out"
+    else:
+        kept = df.tail(max_rows)
+        counter = "dropped_oldest"
+    if stats is not None:
+        stats.increment(stage, counter, len(df) - len(kept))
+    return kept
+
+# Publish counters for other processes
+def save_stats(snapshot, file_path=STATS_FILE):
+    """Writes a counters snapshot atomically as JSON.
+
+    Args:
+        snapshot: Dict as returned by OverloadStats.snapshot()
+        file_path: Destination path
+    """
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(tmp_path, file_path)
+
+# Read counters published by another process
+def load_stats(file_path=STATS_FILE):
+    """Reads a counters snapshot written by save_stats.
+
+    Args:
+        file_path: Snapshot path
+
+    Returns:
+        Dict of counters, empty if the file does not exist
+    """
+    try:
+        with open(file_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
@@ -0,0 +1,392 @@
+import os
+import time
+import hashlib
+import numpy as np
+import joblib
+
+# Define the snapshot file shared between the capture script and the API
+STATE_FILE = "data/host_state.pkl"
+
+# KDD-style host counters saturate at 255
+MAX_HOST_COUNT = 255
+
+# One 64-byte blake2b digest provides at most 8 independent row hashes
+MAX_SKETCH_DEPTH = 8
+
+# Bumped whenever the pickled HostStateIndex layout changes
+STATE_VERSION = 2
+
+# Hash a key to a 64-bit integer
+def _hash64(key):
+    """Returns a stable 64-bit hash of a string key.
+
+    Python's built-in hash() is salted per process, so it cannot be used
+    for sketches persisted across capture runs.
+
+    Args:
+        key: String to hash
+
+    Returns:
+        Unsigned 64-bit integer
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+# Derive one column index per sketch row
+def _row_indices(key, depth, width):
+    """Maps a key to one column per row with an independent hash per row.
+
+    Each row reads its own 8 bytes of one blake2b digest, so two keys that
+    collide in one row are no more likely to collide in the others.
+
+    Args:
+        key: String key
+        depth: Number of rows (at most MAX_SKETCH_DEPTH)
+        width: Number of columns per row
+
+    Returns:
+        List of column indices, one per row
+    """
+    digest = hashlib.blake2b(key.encode(), digest_size=8 * depth).digest()
+    return [int.from_bytes(digest[8 * row:8 * row + 8], "little") % width for row in range(depth)]
+
+class CountMinSketch:
+    """Approximate per-key counters in fixed memory.
+
+    Estimates never undercount; collisions can only inflate them.
+    """
+
+    def __init__(self, width=16384, depth=4):
+        """Allocates the counter table.
+
+        Args:
+            width: Counters per row
+            depth: Number of independent rows
+
+        Raises:
+            ValueError: If depth exceeds MAX_SKETCH_DEPTH
+        """
+        if not 1 <= depth <= MAX_SKETCH_DEPTH:
+            raise ValueError(f"Count-min depth must be between 1 and {MAX_SKETCH_DEPTH}.")
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.float32)
+
+    def add(self, key, count=1.0):
+        """Adds count to the key's counters."""
+        for row, col in enumerate(_row_indices(key, self.depth, self.width)):
+            self.table[row, col] += count
+
+    def estimate(self, key):
+        """Returns the estimated count of a key."""
+        return float(min(self.table[row, col] for row, col in enumerate(_row_indices(key, self.depth, self.width))))
+
+    def clear(self):
+        """Resets every counter to zero."""
+        self.table.fill(0)
+
+class HyperLogLog:
+    """Distinct-count estimator for the items seen by a single host."""
+
+    def __init__(self, precision=10):
+        """Allocates the registers.
+
+        Args:
+            precision: Bits of the item hash used to pick a register
+        """
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, item):
+        """Records an item."""
+        h = _hash64(item)
+        register = h & ((1 << self.precision) - 1)
+        w = h >> self.precision
+        rho = (64 - self.precision) - w.bit_length() + 1
+        if self.registers[register] < rho:
+            self.registers[register] = rho
+
+    def estimate(self, other=None):
+        """Estimates the number of distinct items.
+
+        Args:
+            other: Optional HyperLogLog of the same precision to union with
+
+        Returns:
+            Estimated distinct count
+        """
+        m = 1 << self.precision
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+
+        regs = self.registers
+        if other is not None:
+            regs = np.maximum(regs, other.registers)
+        estimate = alpha * m * m / float(np.sum(np.power(2.0, -regs.astype(np.float64))))
+        zeros = int(np.count_nonzero(regs == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    def clear(self):
+        """Resets every register to zero."""
+        self.registers.fill(0)
+
+class HostStateIndex:
+    """Per-source and per-destination behavioral state for scan detection.
+
+    Tracks packet counts and SYN/RST error counts per IP over a sliding
+    time window with a count-min sketch, which gives every host an
+    estimate. Distinct peers and distinct destination ports are only
+    tracked, with one HyperLogLog each, for the bounded set of top-talker
+    candidates; sharing distinct-count sketches between all hosts inflates
+    the estimates of light hosts beyond use. Memory is fixed at
+    construction and does not grow with the number of hosts.
+
+    The window is approximated with two tumbling halves: counts are
+    current + previous * (remaining share of the previous window) and
+    distinct counts are the union of both halves.
+    """
+
+    def __init__(self, window_seconds=60.0, cms_width=16384, cms_depth=4, top_k=32, hll_precision=10):
+        """Allocates the sketches.
+
+        Args:
+            window_seconds: Length of the sliding window
+            cms_width: Counters per count-min row
+            cms_depth: Number of count-min rows
+            top_k: Number of top talkers tracked per direction
+            hll_precision: Register bits of the per-talker HyperLogLogs
+        """
+        self.state_version = STATE_VERSION
+        self.window_seconds = window_seconds
+        self.top_k = top_k
+        self.hll_precision = hll_precision
+        self.window_start = None
+        self.counts = [CountMinSketch(cms_width, cms_depth) for _ in range(2)]
+        self.talkers = {"src": {}, "dst": {}}
+        # direction -> ip -> {"peers": [current, previous], "ports": [current, previous]}
+        self.distinct = {"src": {}, "dst": {}}
+
+    def _advance(self, now):
+        """Rotates the window halves so that now falls in the current one.
+
+        Top-talker candidates are re-scored on every rotation, so counts
+        from an earlier busy window cannot keep new heavy hosts out.
+        """
+        if self.window_start is None:
+            self.window_start = now
+            return
+        elapsed = now - self.window_start
+        if elapsed < self.window_seconds:
+            return
+        # More than two windows idle: everything has expired
+        if elapsed >= 2 * self.window_seconds:
+            for sketch in self.counts:
+                sketch.clear()
+            self.talkers = {"src": {}, "dst": {}}
+            self.distinct = {"src": {}, "dst": {}}
+            self.window_start = now
+            return
+        self.counts.reverse()
+        self.counts[0].clear()
+        for hosts in self.distinct.values():
+            for sketches in hosts.values():
+                for halves in sketches.values():
+                    halves.reverse()
+                    halves[0].clear()
+        self.window_start += self.window_seconds
+        self._refresh_talkers(now)
+
+    def _refresh_talkers(self, now):
+        """Re-scores the top-talker candidates and drops the idle ones."""
+        for direction, talkers in self.talkers.items():
+            for ip in list(talkers):
+                count = self._count(f"{direction}|{ip}", now)
+                if count > 0:
+                    talkers[ip] = count
+                else:
+                    del talkers[ip]
+                    del self.distinct[direction][ip]
+
+    def _count(self, key, now):
+        """Returns the sliding-window estimate of a counter."""
+        weight = max(0.0, 1.0 - (now - self.window_start) / self.window_seconds)
+        return self.counts[0].estimate(key) + self.counts[1].estimate(key) * weight
+
+    def _distinct(self, direction, ip, name):
+        """Returns the sliding-window distinct-count estimate for a candidate.
+
+        Returns:
+            Estimated distinct count, or None if ip is not a top-talker candidate
+        """
+        sketches = self.distinct[direction].get(ip)
+        if sketches is None:
+            return None
+        current, previous = sketches[name]
+        return current.estimate(previous)
+
+    def _track_talker(self, direction, ip, now):
+        """Keeps ip in the bounded top-talker candidates if it is heavy enough.
+
+        A host admitted as a candidate gets fresh distinct-count sketches;
+        an evicted one loses them, so peers seen before admission are not
+        counted.
+        """
+        talkers = self.talkers[direction]
+        count = self._count(f"{direction}|{ip}", now)
+        if ip not in talkers and len(talkers) >= self.top_k:
+            lightest = min(talkers, key=talkers.get)
+            if count <= talkers[lightest]:
+                return
+            del talkers[lightest]
+            del self.distinct[direction][lightest]
+        talkers[ip] = count
+        if ip not in self.distinct[direction]:
+            self.distinct[direction][ip] = {
+                name: [HyperLogLog(self.hll_precision) for _ in range(2)]
+                for name in ("peers", "ports")
+            }
+
+    def _add_distinct(self, direction, ip, peer, port):
+        """Records peer and port for ip if it is a top-talker candidate."""
+        sketches = self.distinct[direction].get(ip)
+        if sketches is not None:
+            sketches["peers"][0].add(peer)
+            sketches["ports"][0].add(port)
+
+    def update(self, src_ip, dst_ip, dst_port, flag, now=None):
+        """Records one packet.
+
+        Args:
+            src_ip: Source IP address
+            dst_ip: Destination IP address
+            dst_port: Destination port (0 for protocols without ports)
+            flag: KDD-style connection flag; S0 counts as a SYN error and
+                REJ as a reject error
+            now: Packet timestamp in seconds; defaults to the current time
+        """
+        now = time.time() if now is None else now
+        self._advance(now)
+        counts = self.counts[0]
+        counts.add(f"src|{src_ip}")
+        counts.add(f"dst|{dst_ip}")
+        counts.add(f"dst_srv|{dst_ip}|{dst_port}")
+        if flag == "S0":
+            counts.add(f"src_serr|{src_ip}")
+            counts.add(f"dst_serr|{dst_ip}")
+        elif flag == "REJ":
+            counts.add(f"src_rerr|{src_ip}")
+            counts.add(f"dst_rerr|{dst_ip}")
+
+        self._track_talker("src", src_ip, now)
+        self._track_talker("dst", dst_ip, now)
+        self._add_distinct("src", src_ip, dst_ip, str(dst_port))
+        self._add_distinct("dst", dst_ip, src_ip, str(dst_port))
+
+    def features(self, dst_ip, dst_port, now=None):
+        """Computes the model's destination-host features for a packet.
+
+        Args:
+            dst_ip: Destination IP address
+            dst_port: Destination port
+            now: Timestamp in seconds; defaults to the current time
+
+        Returns:
+            Dict with dst_host_count, dst_host_srv_count and the
+            dst_host_* rate features derived from them
+        """
+        now = time.time() if now is None else now
+        self._advance(now)
+        host_count = self._count(f"dst|{dst_ip}", now)
+        srv_count = min(self._count(f"dst_srv|{dst_ip}|{dst_port}", now), host_count)
+        if host_count <= 0:
+            return {}
+        same_srv_rate = srv_count / host_count
+        return {
+            "dst_host_count": min(MAX_HOST_COUNT, int(round(host_count))),
+            "dst_host_srv_count": min(MAX_HOST_COUNT, int(round(srv_count))),
+            "dst_host_same_srv_rate": round(same_srv_rate, 2),
+            "dst_host_diff_srv_rate": round(1.0 - same_srv_rate, 2),
+            "dst_host_serror_rate": round(min(1.0, self._count(f"dst_serr|{dst_ip}", now) / host_count), 2),
+            "dst_host_rerror_rate": round(min(1.0, self._count(f"dst_rerr|{dst_ip}", now) / host_count), 2),
+        }
+
+    def host_stats(self, ip, direction="src", now=None):
+        """Returns the behavioral statistics of one host.
+
+        Args:
+            ip: Host IP address
+            direction: "src" for traffic sent by the host, "dst" for received
+            now: Timestamp in seconds; defaults to the current time
+
+        Returns:
+            Dict with packet count, distinct peers, distinct destination
+            ports, SYN error rate and reject error rate; the distinct
+            counts are None unless ip is a top-talker candidate
+        """
+        now = time.time() if now is None else now
+        self._advance(now)
+        packets = self._count(f"{direction}|{ip}", now)
+        peers = self._distinct(direction, ip, "peers")
+        ports = self._distinct(direction, ip, "ports")
+        return {
+            "ip": ip,
+            "packets": int(round(packets)),
+            "distinct_peers": None if peers is None else int(round(peers)),
+            "distinct_ports": None if ports is None else int(round(ports)),
+            "serror_rate": round(min(1.0, self._count(f"{direction}_serr|{ip}", now) / packets), 4) if packets else 0.0,
+            "rerror_rate": round(min(1.0, self._count(f"{direction}_rerr|{ip}", now) / packets), 4) if packets else 0.0,
+        }
+
+    def top_talkers(self, direction="src", limit=10, now=None):
+        """Returns the heaviest hosts in the current window.
+
+        Args:
+            direction: "src" for senders, "dst" for receivers
+            limit: Maximum number of hosts returned
+            now: Timestamp in seconds; defaults to the current time
+
+        Returns:
+            List of host_stats dicts, heaviest first
+        """
+        stats = [self.host_stats(ip, direction, now) for ip in list(self.talkers[direction])]
+        stats = [s for s in stats if s["packets"] > 0]
+        stats.sort(key=lambda s: s["packets"], reverse=True)
+        return stats[:limit]
+
+# Persist the index between capture runs
+def save_state(index, file_path=STATE_FILE):
+    """Saves a HostStateIndex snapshot atomically.
+
+    Args:
+        index: HostStateIndex to save
+        file_path: Snapshot path
+    """
+    tmp_path = f"{file_path}.tmp"
+    joblib.dump(index, tmp_path)
+    os.replace(tmp_path, file_path)
+
+# Load the persisted index
+def load_state(file_path=STATE_FILE):
+    """Loads the last HostStateIndex snapshot.
+
+    Args:
+        file_path: Snapshot path
+
+    Returns:
+        The saved HostStateIndex, or a new empty one if none exists or it
+        was saved with an older layout
+    """
+    try:
+        index = joblib.load(file_path)
+    except (OSError, EOFError, AttributeError):
+        return HostStateIndex()
+    if getattr(index, "state_version", None) != STATE_VERSION:
+        return HostStateIndex()
+    return index
@@ -0,0 +1,404 @@
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import joblib
+
+# Define the root directory holding one sub-directory per model version
+MODELS_DIR = "data/models"
+
+# Pointer files naming the active and shadow (candidate) versions
+ACTIVE_POINTER = "CURRENT"
+SHADOW_POINTER = "SHADOW"
+
+# Artifact file names inside a version directory
+MODEL_FILE = "model.pkl"
+SCALER_FILE = "scaler.pkl"
+ENCODERS_FILE = "encoders.pkl"
+METADATA_FILE = "metadata.json"
+
+# Pre-registry artifacts, still loaded when no version has been published yet
+LEGACY_MODEL_PATH = "data/decision_tree_model.pkl"
+LEGACY_SCALER_PATH = "data/scaler.pkl"
+LEGACY_VERSION = "legacy"
+
+# Everything needed to score one batch, always loaded from the same version
+ModelBundle = namedtuple("ModelBundle", ["version", "model", "scaler", "encoders"])
+
+# Write a small text file atomically
+def _write_atomic(path, content):
+    """Writes a file through a temporary sibling and an atomic rename.
+
+    Readers either see the previous content or the new one, never a
+    partially written file.
+
+    Args:
+        path: Destination file path
+        content: Text to write
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+# Read a pointer file
+def _read_pointer(models_dir, pointer):
+    """Reads the version named by a pointer file.
+
+    Args:
+        models_dir: Root directory of the model versions
+        pointer: Pointer file name (ACTIVE_POINTER or SHADOW_POINTER)
+
+    Returns:
+        Version name, or None if the pointer is missing, empty or stale
+    """
+    path = os.path.join(models_dir, pointer)
+    try:
+        with open(path) as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    if version in list_versions(models_dir):
+        return version
+    return None
+
+# List published model versions
+def list_versions(models_dir=MODELS_DIR):
+    """Lists the published model versions, oldest first.
+
+    Args:
+        models_dir: Root directory of the model versions
+
+    Returns:
+        List of version names
+    """
+    if not os.path.isdir(models_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(models_dir)
+        if not name.startswith(".") and os.path.isdir(os.path.join(models_dir, name))
+    )
+
+# Publish a trained model as a new version
+def publish_model_version(model, scaler, encoders=None, metadata=None, models_dir=MODELS_DIR, activate=True):
+    """Saves a model, scaler and encoders as a new immutable version.
+
+    The artifacts are written to a hidden staging directory which is then
+    renamed into place, so a version directory is never observed half
+    written. Existing versions are never modified.
+
+    Args:
+        model: Trained model to save
+        scaler: Fitted scaler to save
+        encoders: Dict mapping categorical column names to their category lists
+        metadata: Optional dict of extra information (accuracy, source data...)
+        models_dir: Root directory of the model versions
+        activate: If True, point the active version at the new one
+
+    Returns:
+        Name of the published version
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    version = time.strftime("%Y%m%d-%H%M%S")
+    suffix = 1
+    while os.path.exists(os.path.join(models_dir, version)):
+        suffix += 1
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+
+    staging_dir = os.path.join(models_dir, f".{version}.staging")
+    os.makedirs(staging_dir)
+    joblib.dump(model, os.path.join(staging_dir, MODEL_FILE))
+    joblib.dump(scaler, os.path.join(staging_dir, SCALER_FILE))
+    joblib.dump(encoders or {}, os.path.join(staging_dir, ENCODERS_FILE))
+    info = dict(metadata or {})
+    info["version"] = version
+    info["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with open(os.path.join(staging_dir, METADATA_FILE), "w") as f:
+        json.dump(info, f, indent=2, default=str)
+    os.rename(staging_dir, os.path.join(models_dir, version))
+
+    if activate:
+        set_active_version(version, models_dir)
+    print(f"Model version {version} saved to {models_dir}")
+    return version
+
+# Check that a name refers to a published version
+def _validate_version(version, models_dir):
+    """Accepts only version names returned by list_versions.
+
+    This rejects non-strings, path separators, '.', '..' and hidden
+    (staging) directories, so a pointer can never escape models_dir.
+
+    Args:
+        version: Candidate version name
+        models_dir: Root directory of the model versions
+
+    Raises:
+        ValueError: If the version is not a published version
+    """
+    if not isinstance(version, str) or version not in list_versions(models_dir):
+        raise ValueError(f"Unknown model version: {version}")
+
+# Point the active version at a published version
+def set_active_version(version, models_dir=MODELS_DIR):
+    """Atomically switches the active model version.
+
+    The version is loaded before the pointer is written, so a version
+    whose artifacts cannot be loaded never becomes active.
+
+    Args:
+        version: Name of a published version
+        models_dir: Root directory of the model versions
+
+    Raises:
+        ValueError: If the version does not exist
+    """
+    _validate_version(version, models_dir)
+    load_model_bundle(version, models_dir)
+    _write_atomic(os.path.join(models_dir, ACTIVE_POINTER), version)
+
+# Set or clear the shadow version
+def set_shadow_version(version, models_dir=MODELS_DIR):
+    """Selects the candidate version scored in shadow mode.
+
+    Args:
+        version: Name of a published version, or None to disable shadow mode
+        models_dir: Root directory of the model versions
+
+    Raises:
+        ValueError: If the version does not exist
+    """
+    path = os.path.join(models_dir, SHADOW_POINTER)
+    if version is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    _validate_version(version, models_dir)
+    load_model_bundle(version, models_dir)
+    _write_atomic(path, version)
+
+# Resolve the active version
+def get_active_version(models_dir=MODELS_DIR):
+    """Returns the active model version.
+
+    Falls back to the newest published version when no pointer exists, and
+    to LEGACY_VERSION when nothing has been published yet.
+
+    Args:
+        models_dir: Root directory of the model versions
+
+    Returns:
+        Version name
+    """
+    version = _read_pointer(models_dir, ACTIVE_POINTER)
+    if version:
+        return version
+    versions = list_versions(models_dir)
+    return versions[-1] if versions else LEGACY_VERSION
+
+# Resolve the shadow version
+def get_shadow_version(models_dir=MODELS_DIR):
+    """Returns the shadow model version, or None if shadow mode is off.
+
+    Args:
+        models_dir: Root directory of the model versions
+    """
+    return _read_pointer(models_dir, SHADOW_POINTER)
+
+# Load every artifact of one version
+def load_model_bundle(version=None, models_dir=MODELS_DIR):
+    """Loads model, scaler and encoders from a single version directory.
+
+    Args:
+        version: Version to load; defaults to the active version
+        models_dir: Root directory of the model versions
+
+    Returns:
+        ModelBundle with all artifacts from the same version
+    """
+    if version is None:
+        version = get_active_version(models_dir)
+    if version == LEGACY_VERSION:
+        legacy_dir = os.path.dirname(models_dir)
+        return ModelBundle(
+            version=LEGACY_VERSION,
+            model=joblib.load(os.path.join(legacy_dir, os.path.basename(LEGACY_MODEL_PATH))),
+            scaler=joblib.load(os.path.join(legacy_dir, os.path.basename(LEGACY_SCALER_PATH))),
+            encoders={},
+        )
+    version_dir = os.path.join(models_dir, version)
+    encoders_path = os.path.join(version_dir, ENCODERS_FILE)
+    return ModelBundle(
+        version=version,
+        model=joblib.load(os.path.join(version_dir, MODEL_FILE)),
+        scaler=joblib.load(os.path.join(version_dir, SCALER_FILE)),
+        encoders=joblib.load(encoders_path) if os.path.exists(encoders_path) else {},
+    )
+
+# Keep the running detector on the latest active version
+class ModelWatcher:
+    """Watches the model directory and hot-swaps bundles in a running process.
+
+    New versions are loaded on a background thread; only once every
+    artifact is in memory is the bundle reference replaced, which is a
+    single atomic assignment. A batch that already fetched the previous
+    bundle finishes scoring with it, so no packets are dropped during a
+    swap.
+
+    When a shadow version is selected, score() also runs the candidate on
+    the same batch in parallel and accumulates disagreement and latency
+    statistics for review before promotion.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, poll_interval=5.0):
+        """Loads the active (and shadow) bundle.
+
+        Args:
+            models_dir: Root directory of the model versions
+            poll_interval: Seconds between checks for a new version
+        """
+        self.models_dir = models_dir
+        self.poll_interval = poll_interval
+        self._bundle = load_model_bundle(models_dir=models_dir)
+        self._shadow = None
+        self._shadow_stats = self._empty_shadow_stats(None)
+        self._stats_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.refresh()
+
+    @staticmethod
+    def _empty_shadow_stats(version):
+        """Returns zeroed shadow statistics for a candidate version."""
+        return {
+            "version": version,
+            "batches": 0,
+            "rows": 0,
+            "disagreements": 0,
+            "active_latency_ms": 0.0,
+            "shadow_latency_ms": 0.0,
+        }
+
+    def current(self):
+        """Returns the active ModelBundle."""
+        return self._bundle
+
+    def shadow(self):
+        """Returns the shadow ModelBundle, or None if shadow mode is off."""
+        return self._shadow
+
+    def refresh(self):
+        """Reloads the active and shadow bundles if their pointers changed.
+
+        Serialized by a lock, since the poll thread and the API handlers
+        may call it concurrently.
+
+        Returns:
+            True if the active bundle was swapped
+        """
+        with self._refresh_lock:
+            swapped = False
+            active_version = get_active_version(self.models_dir)
+            if active_version != self._bundle.version:
+                self._bundle = load_model_bundle(active_version, self.models_dir)
+                print(f"Swapped active model to version {active_version}")
+                swapped = True
+
+            shadow_version = get_shadow_version(self.models_dir)
+            current_shadow = self._shadow.version if self._shadow else None
+            if shadow_version != current_shadow:
+                self._shadow = load_model_bundle(shadow_version, self.models_dir) if shadow_version else None
+                with self._stats_lock:
+                    self._shadow_stats = self._empty_shadow_stats(shadow_version)
+            return swapped
+
+    def start(self):
+        """Starts polling for new versions on a daemon thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._poll, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the polling thread."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _poll(self):
+        """Polling loop run by the watcher thread."""
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error reloading model: {e}")
+
+    def score(self, score_fn, data):
+        """Scores a batch with the active bundle, and the shadow one if set.
+
+        Args:
+            score_fn: Callable (bundle, data) returning a DataFrame with a
+                'predicted_class' column
+            data: Batch passed unchanged to score_fn
+
+        Returns:
+            Tuple (bundle, result) for the active bundle
+        """
+        bundle = self._bundle
+        shadow = self._shadow
+        shadow_future = None
+        if shadow is not None:
+            shadow_future = self._executor.submit(self._timed, score_fn, shadow, data)
+
+        result, active_ms = self._timed(score_fn, bundle, data)
+
+        if shadow_future is not None:
+            try:
+                shadow_result, shadow_ms = shadow_future.result()
+                self._record_shadow(shadow.version, result, shadow_result, active_ms, shadow_ms)
+            except Exception as e:
+                print(f"Error scoring shadow model {shadow.version}: {e}")
+        return bundle, result
+
+    @staticmethod
+    def _timed(score_fn, bundle, data):
+        """Runs score_fn and returns its result with the latency in ms."""
+        started = time.perf_counter()
+        result = score_fn(bundle, data)
+        return result, (time.perf_counter() - started) * 1000.0
+
+    def _record_shadow(self, version, active_result, shadow_result, active_ms, shadow_ms):
+        """Accumulates disagreement and latency for one shadow-scored batch."""
+        rows = len(active_result)
+        disagreements = int((active_result['predicted_class'].values != shadow_result['predicted_class'].values).sum())
+        with self._stats_lock:
+            if self._shadow_stats["version"] != version:
+                return
+            self._shadow_stats["batches"] += 1
+            self._shadow_stats["rows"] += rows
+            self._shadow_stats["disagreements"] += disagreements
+            self._shadow_stats["active_latency_ms"] += active_ms
+            self._shadow_stats["shadow_latency_ms"] += shadow_ms
+
+    def shadow_report(self):
+        """Summarizes shadow scoring since the candidate was selected.
+
+        Returns:
+            Dict with the disagreement rate and the mean per-batch latency
+            delta (shadow minus active, in ms), or None if shadow mode is off
+        """
+        with self._stats_lock:
+            stats = dict(self._shadow_stats)
+        if stats["version"] is None:
+            return None
+        batches = stats["batches"]
+        stats["disagreement_rate"] = stats["disagreements"] / stats["rows"] if stats["rows"] else 0.0
+        stats["mean_latency_delta_ms"] = (
+            (stats["shadow_latency_ms"] - stats["active_latency_ms"]) / batches if batches else 0.0
+        )
+        return stats
@@ -1,51 +1,64 @@
+import sys
 import pandas as pd
-import joblib
+from model_registry import load_model_bundle, MODELS_DIR
+from prediction_history import PredictionHistory
+import backpressure
 
-# Load model and scaler
-model = joblib.load("data/decision_tree_model.pkl")
-scaler = joblib.load("data/scaler.pkl")
+# Define the input and output file paths
+INPUT_FILE = "data/live_data.csv"
+OUTPUT_FILE = "data/live_predictions.csv"
 
-# Load live data
-live_data = pd.read_csv("data/live_data.csv")
-
-# Drop irrelevant columns
+# Irrelevant columns dropped before scoring
 columns_to_drop = [
     'wrong_fragment', 'urgent', 'hot', 'num_failed_logins', 'logged_in', 'num_compromised',
     'root_shell', 'su_attempted', 'num_root', 'num_file_creations', 'num_shells',
     'num_access_files', 'num_outbound_cmds', 'is_host_login', 'is_guest_login', 'class'
 ]
-live_data = live_data.drop(columns=[col for col in columns_to_drop if col in live_data.columns], errors='ignore')
 
-# Keep only meaningful traffic
-live_data = live_data[(live_data['src_bytes'] > 0) | (live_data['dst_bytes'] > 0)]
+# Connection columns carried through to the predictions for logs and history
+metadata_columns = ['src_ip', 'dst_ip', 'src_port', 'dst_port']
+
+# Load live data
+def load_live_data(file_path=INPUT_FILE):
+    """Loads the captured live network data and keeps meaningful traffic.
 
-# Ensure all expected features exist
-expected_cols = scaler.feature_names_in_
-for col in expected_cols:
-    if col not in live_data.columns:
-        live_data[col] = 0.0
+    Args:
+        file_path: Path to the live data CSV file
 
-# Encode categorical columns
-for col in live_data.select_dtypes(include='object').columns:
-    live_data[col] = pd.factorize(live_data[col])[0]
+    Returns:
+        DataFrame with irrelevant columns dropped and empty packets removed
+    """
+    live_data = pd.read_csv(file_path)
+    live_data = live_data.drop(columns=[col for col in columns_to_drop if col in live_data.columns], errors='ignore')
+
+    # Keep only meaningful traffic
+    return live_data[(live_data['src_bytes'] > 0) | (live_data['dst_bytes'] > 0)]
 
-# Reorder columns
-live_data = live_data[expected_cols]
+# Encode categorical columns
+def encode_categoricals(df, encoders):
+    """Encodes categorical columns with the categories seen at training time.
 
-# Scale features
-live_scaled = scaler.transform(live_data)
+    Columns without a stored encoder (models trained before encoders were
+    saved) fall back to factorizing the batch.
 
-# Predict probabilities
-probs = model.predict_proba(live_scaled)[:, 1]
-live_data['intrusion_prob'] = probs
+    Args:
+        df: DataFrame to encode in place
+        encoders: Dict mapping column names to their training category lists
+    """
+    for col in df.select_dtypes(include='object').columns:
+        if col in encoders:
+            mapping = {category: code for code, category in enumerate(encoders[col])}
+            df[col] = df[col].map(mapping).fillna(-1).astype(int)
+        else:
+            df[col] = pd.factorize(df[col])[0]
 
 # Classify based on range
 def classify(prob):
     """Classifies a probability into an intrusion category.
-    
+
     Args:
         prob: Probability value between 0 and 1
-        
+
     Returns:
         1 for intrusion, -1 for uncertain, 0 for normal
     """
@@ -56,18 +69,16 @@ def classify(prob):
     else:
         return 0  # Normal
 
-live_data['predicted_class'] = live_data['intrusion_prob'].apply(classify)
-
 # Rule-based override: skip small outbound-only packets
 def override(row):
     """Applies rule-based override to prediction results.
-    
+
     Small outbound-only packets with low intrusion probability are
     classified as normal (0) regardless of the model's prediction.
-    
+
     Args:
         row: DataFrame row containing prediction data
-        
+
     Returns:
         Modified prediction class (0, -1, or 1)
     """
@@ -75,27 +86,134 @@ def override(row):
         return 0
     return row['predicted_class']
 
-live_data['predicted_class'] = live_data.apply(override, axis=1)
-
-# Save predictions
-live_data.to_csv("data/live_predictions.csv", index=False)
-
-# Output result
-print("\nPrediction Summary:")
-print(live_data['predicted_class'].value_counts())
-print("Avg Intrusion Probability:", round(live_data['intrusion_prob'].mean(), 4))
-
-# Final status
-# Output result with probability check
-intrusion_detected = any(live_data['predicted_class'] == 1)
-uncertain_detected = any(live_data['predicted_class'] == -1)
-avg_prob = live_data['intrusion_prob'].mean()
-
-if intrusion_detected and avg_prob >= 0.5:
-    print("\nHigh-confidence intrusion detected!")
-elif intrusion_detected and avg_prob < 0.5:
-    print("\nSome packets were flagged as intrusion, but average confidence is low.")
-elif uncertain_detected:
-    print("\nSome traffic is uncertain — review advised.")
-else:
-    print("\nAll traffic appears normal.")
\ No newline at end of file
+# Score a batch with one model bundle
+def predict(bundle, live_data):
+    """Scores a batch of live traffic with a single model version.
+
+    Args:
+        bundle: ModelBundle holding the model, scaler and encoders
+        live_data: DataFrame returned by load_live_data
+
+    Returns:
+        DataFrame of model features plus 'intrusion_prob' and 'predicted_class'
+    """
+    features = live_data.copy()
+
+    # Ensure all expected features exist
+    expected_cols = bundle.scaler.feature_names_in_
+    for col in expected_cols:
+        if col not in features.columns:
+            features[col] = 0.0
+
+    encode_categoricals(features, bundle.encoders)
+
+    # Reorder columns
+    features = features[expected_cols]
+
+    if features.empty:
+        features['intrusion_prob'] = pd.Series(dtype=float)
+        features['predicted_class'] = pd.Series(dtype=int)
+        return features
+
+    # Scale features and predict probabilities
+    live_scaled = bundle.scaler.transform(features)
+    features['intrusion_prob'] = bundle.model.predict_proba(live_scaled)[:, 1]
+    features['predicted_class'] = features['intrusion_prob'].apply(classify)
+    features['predicted_class'] = features.apply(override, axis=1)
+    return features
+
+# Summarize the predictions
+def summarize(predictions, version):
+    """Builds the human-readable summary of a prediction run.
+
+    Args:
+        predictions: DataFrame returned by predict
+        version: Model version used for scoring
+
+    Returns:
+        Summary text
+    """
+    lines = [
+        "",
+        f"Model version: {version}",
+        "Prediction Summary:",
+        str(predictions['predicted_class'].value_counts()),
+        f"Avg Intrusion Probability: {round(predictions['intrusion_prob'].mean(), 4)}",
+    ]
+
+    # Final status
+    # Output result with probability check
+    intrusion_detected = any(predictions['predicted_class'] == 1)
+    uncertain_detected = any(predictions['predicted_class'] == -1)
+    avg_prob = predictions['intrusion_prob'].mean()
+
+    lines.append("")
+    if intrusion_detected and avg_prob >= 0.5:
+        lines.append("High-confidence intrusion detected!")
+    elif intrusion_detected and avg_prob < 0.5:
+        lines.append("Some packets were flagged as intrusion, but average confidence is low.")
+    elif uncertain_detected:
+        lines.append("Some traffic is uncertain — review advised.")
+    else:
+        lines.append("All traffic appears normal.")
+    return "\n".join(lines)
+
+# Run one detection cycle
+def run_detection(watcher=None, input_path=INPUT_FILE, output_path=OUTPUT_FILE, models_dir=MODELS_DIR, history=None,
+                  max_rows=None, policy=backpressure.DROP_OLDEST, stats=None):
+    """Scores the captured live data and saves the predictions.
+
+    When a ModelWatcher is given (the long-running Flask detector), the
+    batch is scored with whatever bundle is active at that moment and, if
+    configured, shadow-scored with the candidate. Otherwise the active
+    bundle is loaded once for this run.
+
+    When max_rows is set, a larger capture is reduced with the overload
+    policy before scoring, so a traffic spike costs part of the batch
+    rather than the whole cycle.
+
+    Args:
+        watcher: Optional ModelWatcher owned by the caller
+        input_path: Path to the live data CSV file
+        output_path: Path where the predictions CSV will be saved
+        models_dir: Root directory of the model versions (without a watcher)
+        history: Optional PredictionHistory the predictions are appended to
+        max_rows: Optional maximum number of rows scored per cycle
+        policy: Overload policy used to shed rows beyond max_rows
+        stats: Optional backpressure.OverloadStats receiving the inference counters
+
+    Returns:
+        Summary text of the run
+    """
+    live_data = load_live_data(input_path)
+    if max_rows is not None:
+        live_data = backpressure.shed_rows(live_data, max_rows, policy, stats)
+    if stats is not None:
+        stats.increment("inference", "accepted", len(live_data))
+    if watcher is not None:
+        bundle, predictions = watcher.score(predict, live_data)
+    else:
+        bundle = load_model_bundle(models_dir=models_dir)
+        predictions = predict(bundle, live_data)
+
+    # Keep the connection details alongside each prediction
+    for col in metadata_columns:
+        if col in live_data.columns:
+            predictions[col] = live_data[col]
+
+    # Save predictions
+    predictions.to_csv(output_path, index=False)
+    if history is not None:
+        history.record(predictions)
+    return summarize(predictions, bundle.version)
+
+# Execute if run directly
+if __name__ == "__main__":
+    # Allow command-line override of the model version
+    if len(sys.argv) > 1:
+        bundle = load_model_bundle(sys.argv[1])
+        predictions = predict(bundle, load_live_data())
+        predictions.to_csv(OUTPUT_FILE, index=False)
+        print(summarize(predictions, bundle.version))
+    else:
+        print(run_detection(history=PredictionHistory()))
@@ -0,0 +1,299 @@
+import time
+import sqlite3
+from contextlib import closing
+import pandas as pd
+
+# Define the history database path
+HISTORY_DB = "data/predictions.db"
+
+# Keep raw predictions for one day by default
+RAW_RETENTION_SECONDS = 24 * 3600
+
+# Bucket sizes and how long each rollup resolution is kept
+RESOLUTIONS = {
+    "minute": 60,
+    "hour": 3600,
+}
+ROLLUP_RETENTION_SECONDS = {
+    "minute": 7 * 24 * 3600,
+    "hour": 365 * 24 * 3600,
+}
+
+# Number of source IPs reported per bucket
+TOP_IPS_PER_BUCKET = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    src_ip TEXT,
+    dst_ip TEXT,
+    src_port INTEGER,
+    dst_port INTEGER,
+    intrusion_prob REAL NOT NULL,
+    predicted_class INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_ts ON predictions (ts);
+CREATE INDEX IF NOT EXISTS idx_predictions_class_ts ON predictions (predicted_class, ts);
+CREATE INDEX IF NOT EXISTS idx_predictions_src_ip_ts ON predictions (src_ip, ts);
+CREATE INDEX IF NOT EXISTS idx_predictions_dst_port_ts ON predictions (dst_port, ts);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    resolution TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    normal INTEGER NOT NULL DEFAULT 0,
+    uncertain INTEGER NOT NULL DEFAULT 0,
+    intrusion INTEGER NOT NULL DEFAULT 0,
+    prob_sum REAL NOT NULL DEFAULT 0,
+    prob_max REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (resolution, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_ips (
+    resolution TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    src_ip TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (resolution, bucket, src_ip)
+);
+"""
+
+class PredictionHistory:
+    """Prediction history with raw retention and time-bucketed rollups.
+
+    Every batch of predictions is appended to the raw table and, in the
+    same transaction, folded into per-minute and per-hour rollups (counts
+    by class, sum/max of intrusion_prob, top source IPs). Raw rows older
+    than the retention window are pruned on each write, so the database
+    stays bounded while dashboard charts are answered from the rollups
+    without touching raw rows.
+
+    Only the TOP_IPS_PER_BUCKET busiest source IPs are stored per bucket.
+    An IP that falls out of a bucket's top list loses its count, so counts
+    are exact for IPs that stay in the top list from their first batch and
+    may undercount IPs that enter it later.
+    """
+
+    def __init__(self, db_path=HISTORY_DB, raw_retention_seconds=RAW_RETENTION_SECONDS):
+        """Opens (and if needed creates) the history database.
+
+        Args:
+            db_path: Path of the SQLite database file
+            raw_retention_seconds: How long raw predictions are kept
+        """
+        self.db_path = db_path
+        self.raw_retention_seconds = raw_retention_seconds
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # Databases written before the top list was enforced hold every IP
+            with conn:
+                conn.execute(
+                    "DELETE FROM rollup_ips WHERE rowid IN (SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER "
+                    "(PARTITION BY resolution, bucket ORDER BY count DESC, src_ip) AS rank FROM rollup_ips) "
+                    "WHERE rank > ?)",
+                    (TOP_IPS_PER_BUCKET,),
+                )
+
+    def _connect(self):
+        """Opens a new connection; one per call keeps Flask threads independent."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, predictions, ts=None):
+        """Appends a batch of predictions and updates the rollups.
+
+        Args:
+            predictions: DataFrame with 'intrusion_prob' and 'predicted_class'
+                columns, and optionally src_ip, dst_ip, src_port, dst_port
+            ts: Timestamp of the batch in seconds; defaults to now
+
+        Returns:
+            Number of rows recorded
+        """
+        ts = time.time() if ts is None else ts
+        if predictions.empty:
+            return 0
+
+        def column(name):
+            if name in predictions.columns:
+                return [None if pd.isna(value) else value for value in predictions[name].tolist()]
+            return [None] * len(predictions)
+
+        probs = [float(p) for p in predictions['intrusion_prob']]
+        classes = [int(c) for c in predictions['predicted_class']]
+        src_ips = column('src_ip')
+        dst_ips = column('dst_ip')
+        src_ports = [None if p is None else int(p) for p in column('src_port')]
+        dst_ports = [None if p is None else int(p) for p in column('dst_port')]
+        rows = list(zip([ts] * len(probs), src_ips, dst_ips, src_ports, dst_ports, probs, classes))
+
+        # Aggregate the batch once; every row shares the same buckets
+        batch = {
+            'total': len(rows),
+            'normal': classes.count(0),
+            'uncertain': classes.count(-1),
+            'intrusion': classes.count(1),
+            'prob_sum': sum(probs),
+            'prob_max': max(probs),
+        }
+        ip_counts = {}
+        for ip in src_ips:
+            if ip is not None:
+                ip_counts[ip] = ip_counts.get(ip, 0) + 1
+
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT INTO predictions (ts, src_ip, dst_ip, src_port, dst_port, intrusion_prob, predicted_class) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            for resolution, size in RESOLUTIONS.items():
+                bucket = int(ts // size) * size
+                conn.execute(
+                    "INSERT INTO rollups (resolution, bucket, total, normal, uncertain, intrusion, prob_sum, prob_max) "
+                    "VALUES (:resolution, :bucket, :total, :normal, :uncertain, :intrusion, :prob_sum, :prob_max) "
+                    "ON CONFLICT (resolution, bucket) DO UPDATE SET "
+                    "total = total + excluded.total, normal = normal + excluded.normal, "
+                    "uncertain = uncertain + excluded.uncertain, intrusion = intrusion + excluded.intrusion, "
+                    "prob_sum = prob_sum + excluded.prob_sum, prob_max = MAX(prob_max, excluded.prob_max)",
+                    dict(batch, resolution=resolution, bucket=bucket),
+                )
+                self._update_top_ips(conn, resolution, bucket, ip_counts)
+            self._prune(conn, ts)
+        return len(rows)
+
+    def _update_top_ips(self, conn, resolution, bucket, ip_counts):
+        """Merges a batch's source IP counts into a bucket's top list.
+
+        Args:
+            conn: Connection with an open transaction
+            resolution: Rollup resolution
+            bucket: Bucket start in seconds
+            ip_counts: Dict of source IP -> count in the batch
+        """
+        counts = dict(conn.execute(
+            "SELECT src_ip, count FROM rollup_ips WHERE resolution = ? AND bucket = ?",
+            (resolution, bucket),
+        ).fetchall())
+        for ip, count in ip_counts.items():
+            counts[ip] = counts.get(ip, 0) + count
+        top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:TOP_IPS_PER_BUCKET]
+        conn.execute("DELETE FROM rollup_ips WHERE resolution = ? AND bucket = ?", (resolution, bucket))
+        conn.executemany(
+            "INSERT INTO rollup_ips (resolution, bucket, src_ip, count) VALUES (?, ?, ?, ?)",
+            [(resolution, bucket, ip, count) for ip, count in top],
+        )
+
+    def _prune(self, conn, now):
+        """Deletes raw rows and rollups that fell out of their retention window."""
+        conn.execute("DELETE FROM predictions WHERE ts < ?", (now - self.raw_retention_seconds,))
+        for resolution, retention in ROLLUP_RETENTION_SECONDS.items():
+            cutoff = now - retention
+            conn.execute("DELETE FROM rollups WHERE resolution = ? AND bucket < ?", (resolution, cutoff))
+            conn.execute("DELETE FROM rollup_ips WHERE resolution = ? AND bucket < ?", (resolution, cutoff))
+
+    def stats(self, start, end, resolution="minute"):
+        """Returns rollup buckets in a time range.
+
+        The cost depends on the number of buckets in the range, not on the
+        number of predictions recorded.
+
+        Args:
+            start: Range start in seconds (inclusive)
+            end: Range end in seconds (exclusive)
+            resolution: 'minute' or 'hour'
+
+        Returns:
+            List of bucket dicts, oldest first
+
+        Raises:
+            ValueError: If the resolution is unknown
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}. Use one of {', '.join(RESOLUTIONS)}.")
+        first_bucket = int(start // RESOLUTIONS[resolution]) * RESOLUTIONS[resolution]
+
+        with closing(self._connect()) as conn:
+            buckets = conn.execute(
+                "SELECT * FROM rollups WHERE resolution = ? AND bucket >= ? AND bucket < ? ORDER BY bucket",
+                (resolution, first_bucket, end),
+            ).fetchall()
+            ip_rows = conn.execute(
+                "SELECT bucket, src_ip, count FROM rollup_ips WHERE resolution = ? AND bucket >= ? AND bucket < ? "
+                "ORDER BY bucket, count DESC, src_ip",
+                (resolution, first_bucket, end),
+            ).fetchall()
+
+        # rollup_ips holds at most TOP_IPS_PER_BUCKET rows per bucket
+        top_ips = {}
+        for row in ip_rows:
+            top_ips.setdefault(row['bucket'], []).append({'src_ip': row['src_ip'], 'count': row['count']})
+
+        return [
+            {
+                'bucket': row['bucket'],
+                'total': row['total'],
+                'counts': {'normal': row['normal'], 'uncertain': row['uncertain'], 'intrusion': row['intrusion']},
+                'mean_intrusion_prob': row['prob_sum'] / row['total'] if row['total'] else 0.0,
+                'max_intrusion_prob': row['prob_max'],
+                'top_source_ips': top_ips.get(row['bucket'], []),
+            }
+            for row in buckets
+        ]
+
+    def iter_predictions(self, start=None, end=None, classes=None, src_ip=None, dst_port=None, limit=None, batch_size=500):
+        """Streams raw predictions matching the given filters, newest first.
+
+        Filters are pushed down to SQLite, where each one is backed by an
+        index on (column, ts). Rows are fetched in batches so the full
+        result is never held in memory.
+
+        Args:
+            start: Optional range start in seconds (inclusive)
+            end: Optional range end in seconds (exclusive)
+            classes: Optional list of predicted_class values to keep
+            src_ip: Optional source IP to match
+            dst_port: Optional destination port to match
+            limit: Optional maximum number of rows
+            batch_size: Rows fetched from SQLite per round trip
+
+        Yields:
+            Dict per prediction with the raw table's columns
+        """
+        clauses = []
+        params = []
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(end)
+        if classes:
+            clauses.append(f"predicted_class IN ({', '.join('?' for _ in classes)})")
+            params.extend(classes)
+        if src_ip is not None:
+            clauses.append("src_ip = ?")
+            params.append(src_ip)
+        if dst_port is not None:
+            clauses.append("dst_port = ?")
+            params.append(dst_port)
+
+        query = "SELECT * FROM predictions"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY ts DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+# Define where profiled subprocesses write their results
+PROFILE_DIR = "data/profiles"
+
+# Default sampling interval (seconds)
+DEFAULT_INTERVAL = 0.005
+
+# Number of functions reported as hot spots
+TOP_FUNCTIONS = 25
+
+# Label a stack frame
+def _frame_label(frame):
+    """Returns 'file.py:function' for a frame."""
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class SamplingProfiler:
+    """Low-overhead statistical profiler for a running process.
+
+    A background thread periodically snapshots the stack of every other
+    thread with sys._current_frames(); the profiled code is not
+    instrumented, so its overhead is bounded by the sampling rate and it
+    can be attached to and detached from a live process at any time.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, exclude_threads=()):
+        """Creates an idle profiler.
+
+        Args:
+            interval: Seconds between samples
+            exclude_threads: Thread idents not to sample (e.g. the caller
+                waiting for the profile)
+        """
+        self.interval = interval
+        self.exclude_threads = set(exclude_threads)
+        self.samples = 0
+        self.stacks = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts a new profile, sampling on a daemon thread."""
+        if self._thread is not None:
+            return
+        self.samples = 0
+        self.stacks = {}
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops sampling and waits for the sampling thread to exit."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self):
+        """True while the sampling thread is active."""
+        return self._thread is not None
+
+    def _run(self):
+        """Sampling loop run by the profiler thread."""
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or thread_id in self.exclude_threads:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                stack = ";".join(reversed(labels))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Returns the profile in collapsed-stack format.
+
+        One 'thread;outer;...;inner count' line per distinct stack, as
+        consumed by flamegraph.pl and speedscope.
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(self.stacks.items()))
+
+    def hot_spots(self, limit=TOP_FUNCTIONS):
+        """Returns the functions with the most samples.
+
+        Args:
+            limit: Maximum number of functions
+
+        Returns:
+            List of dicts with self samples (function on top of the stack),
+            total samples (function anywhere on the stack) and their share
+            of all thread samples, sorted by self samples
+        """
+        self_counts = {}
+        total_counts = {}
+        thread_samples = sum(self.stacks.values())
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            self_counts[frames[-1]] = self_counts.get(frames[-1], 0) + count
+            for function in set(frames):
+                total_counts[function] = total_counts.get(function, 0) + count
+
+        ranked = sorted(total_counts, key=lambda f: (self_counts.get(f, 0), total_counts[f]), reverse=True)
+        return [
+            {
+                'function': function,
+                'self': self_counts.get(function, 0),
+                'total': total_counts[function],
+                'self_pct': round(100.0 * self_counts.get(function, 0) / thread_samples, 2) if thread_samples else 0.0,
+                'total_pct': round(100.0 * total_counts[function] / thread_samples, 2) if thread_samples else 0.0,
+            }
+            for function in ranked[:limit]
+        ]
+
+    def report(self):
+        """Returns the profile as a JSON-serializable dict."""
+        return {
+            'pid': os.getpid(),
+            'interval': self.interval,
+            'samples': self.samples,
+            'hot_spots': self.hot_spots(),
+            'collapsed': self.collapsed(),
+        }
+
+# Profile the current process for a fixed duration
+def profile_for(seconds, interval=DEFAULT_INTERVAL):
+    """Samples every other thread of the current process for a number of seconds.
+
+    Args:
+        seconds: Duration of the profile
+        interval: Seconds between samples
+
+    Returns:
+        Dict as returned by SamplingProfiler.report()
+    """
+    profiler = SamplingProfiler(interval, exclude_threads=[threading.get_ident()])
+    profiler.start()
+    time.sleep(seconds)
+    profiler.stop()
+    return profiler.report()
+
+# Paths used to exchange profiles with a subprocess
+def request_path(pid, profile_dir=PROFILE_DIR):
+    """Returns the file that asks process pid for a profile."""
+    return os.path.join(profile_dir, f"{pid}.request")
+
+def profile_path(pid, profile_dir=PROFILE_DIR):
+    """Returns the JSON file process pid writes its report to."""
+    return os.path.join(profile_dir, f"{pid}.json")
+
+# Serve profile requests from another process
+def serve_profile_requests(profile_dir=PROFILE_DIR, poll_interval=0.5, interval=DEFAULT_INTERVAL):
+    """Lets another process profile this one without restarting it.
+
+    A daemon thread polls for request_path(pid); when it appears, this
+    process is sampled for the requested number of seconds and the report
+    is written to profile_path(pid). If the process exits mid-profile, the
+    partial report is written at exit. A request file is used instead of a
+    signal so it also works on Windows and cannot kill a process that has
+    not installed a handler yet.
+
+    Args:
+        profile_dir: Directory holding request and report files
+        poll_interval: Seconds between checks for a request
+        interval: Seconds between samples
+    """
+    pid = os.getpid()
+    profiler = SamplingProfiler(interval)
+    lock = threading.Lock()
+
+    def write_report():
+        with lock:
+            if not profiler.running:
+                return
+            profiler.stop()
+            path = profile_path(pid, profile_dir)
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(profiler.report(), f)
+            os.replace(f"{path}.tmp", path)
+
+    def poll():
+        # This thread only sleeps while sampling; keep it out of the profile
+        profiler.exclude_threads.add(threading.get_ident())
+        request_file = request_path(pid, profile_dir)
+        while True:
+            time.sleep(poll_interval)
+            if not os.path.exists(request_file):
+                continue
+            try:
+                with open(request_file) as f:
+                    seconds = float(json.load(f)["seconds"])
+                os.remove(request_file)
+            except (OSError, ValueError, KeyError):
+                continue
+            profiler.start()
+            time.sleep(seconds)
+            write_report()
+
+    atexit.register(write_report)
+    threading.Thread(target=poll, name="profile-requests", daemon=True).start()
+
+# Ask a subprocess for a profile
+def request_profile(pid, seconds, profile_dir=PROFILE_DIR):
+    """Asks a process running serve_profile_requests for a profile.
+
+    Args:
+        pid: Process ID
+        seconds: Duration of the profile
+        profile_dir: Directory holding request and report files
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    report = profile_path(pid, profile_dir)
+    if os.path.exists(report):
+        os.remove(report)
+    path = request_path(pid, profile_dir)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"seconds": seconds}, f)
+    os.replace(f"{path}.tmp", path)
+
+# Collect a subprocess's profile
+def wait_for_profile(pid, timeout, profile_dir=PROFILE_DIR):
+    """Waits for the report requested with request_profile.
+
+    Args:
+        pid: Process ID
+        timeout: Maximum seconds to wait
+        profile_dir: Directory holding request and report files
+
+    Returns:
+        Report dict, or None if none arrived in time (the request is withdrawn)
+    """
+    report = profile_path(pid, profile_dir)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.path.exists(report):
+            with open(report) as f:
+                result = json.load(f)
+            os.remove(report)
+            return result
+        time.sleep(0.1)
+    if os.path.exists(request_path(pid, profile_dir)):
+        os.remove(request_path(pid, profile_dir))
+    return None
@@ -1,21 +1,42 @@
-from scapy.all import sniff, IP, TCP, UDP
+from scapy.all import AsyncSniffer, Scapy_Exception, IP, TCP, UDP
 import pandas as pd
 import time
 import signal
 import sys
 import os
+import threading
+import host_state
+import backpressure
+import sampling_profiler
 
 # Initialize global variables
 packet_count = 0
 start_time = None
-packet_data = []
+packet_data = None
+host_index = None
+capture_queue = None
+overload_stats = None
+capture_done = threading.Event()
+drain_expired = threading.Event()
 
 # Define the duration for packet capture (in seconds)
 DURATION = 10
 
+# Define the overload policy and the queue bounds between stages
+OVERLOAD_POLICY = backpressure.DROP_OLDEST
+CAPTURE_QUEUE_SIZE = 5000  # Packets waiting for feature extraction
+MAX_RECORDS = 50000  # Extracted records waiting for inference
+
+# Seconds allowed to finish extracting queued packets once capture stops
+DRAIN_TIMEOUT = 5
+
 # Define the output file path
 OUTPUT_FILE = "data/live_data.csv"
 
+# File the backend creates to ask a running capture to stop early
+STOP_FILE = "data/capture.stop"
+STOP_POLL_INTERVAL = 0.5  # Seconds between checks for STOP_FILE
+
 # Ensure data directory exists
 def ensure_data_dir():
     """Ensures that the data directory exists.
@@ -33,11 +54,65 @@ def signal_handler(sig, frame):
         frame: Current stack frame
     """
     print("\nCapture interrupted. Saving data...")
+    capture_done.set()
+    drain_expired.set()
     save_to_csv()
     sys.exit(0)
 
+# Check whether the backend asked the capture to stop
+def stop_requested():
+    """Returns True once STOP_FILE exists.
+    
+    The backend stops an overrunning capture by creating this file rather
+    than by a signal, because terminating a process on Windows never runs
+    its signal handlers and would lose everything captured so far.
+    """
+    return os.path.exists(STOP_FILE)
+
+# Wait for a thread while watching for a stop request
+def join_unless_stopped(thread, timeout):
+    """Waits for a thread to finish, for at most timeout seconds.
+    
+    Args:
+        thread: Thread to wait for
+        timeout: Maximum seconds to wait
+        
+    Returns:
+        True if the wait ended because a stop was requested
+    """
+    deadline = time.time() + timeout
+    while thread.is_alive() and time.time() < deadline:
+        if stop_requested():
+            return True
+        thread.join(min(STOP_POLL_INTERVAL, max(0.0, deadline - time.time())))
+    return False
+
+# Identify the flow a packet belongs to
+def flow_key(packet):
+    """Returns the key identifying a packet's flow.
+    
+    Built with backpressure.flow_key from the same fields as the records'
+    src_ip, dst_ip, src_port and dst_port columns, so inference samples
+    the same flows as capture.
+    
+    Args:
+        packet: The captured network packet
+        
+    Returns:
+        Flow key string, or None for non-IP packets
+    """
+    if IP not in packet:
+        return None
+    if TCP in packet:
+        ports = (packet[TCP].sport, packet[TCP].dport)
+    elif UDP in packet:
+        ports = (packet[UDP].sport, packet[UDP].dport)
+    else:
+        ports = (0, 0)
+    return backpressure.flow_key(packet[IP].src, packet[IP].dst, *ports)
+
 # Process each captured packet
-def process_packet(packet):
+def process_packet(packet, header_only=False):
     """Processes each captured packet to extract relevant features.
     
     This function extracts network features from each packet including:
@@ -46,31 +121,28 @@ def process_packet(packet):
     - Source and destination ports
     - Packet size
     - TCP flags (if applicable)
+    - Per-host behavioral features (dst_host_*) from the host state index
+    
+    In header-only mode (set by the header_only overload policy when
+    extraction falls behind) the host state index is skipped and the
+    dst_host_* features keep their defaults.
     
     Args:
         packet: The captured network packet
-        
-    Returns:
-        True to continue capturing, False to stop
+        header_only: If True, extract header features only
     """
-    global packet_count, start_time, packet_data
+    global packet_count, start_time, host_index
     
     # Initialize start time on first packet
     if start_time is None:
         start_time = time.time()
     
-    # Check if duration exceeded
     elapsed = time.time() - start_time
-    if elapsed > DURATION:
-        print(f"\nCapture duration ({DURATION}s) reached. Saving data...")
-        save_to_csv()
-        return False
     
     # Extract basic IP information if present
     if IP in packet:
         src_ip = packet[IP].src
         dst_ip = packet[IP].dst
-        proto = packet[IP].proto
         service = "other"
         flag = "OTH"
         src_bytes = 0
@@ -114,6 +186,16 @@ def process_packet(packet):
             sport = 0
             dport = 0
         
+        # Update per-host state and derive the destination-host features
+        host_features = {}
+        if not header_only:
+            if host_index is None:
+                host_index = host_state.load_state()
+            # Window by capture time, not by when extraction catches up
+            now = float(packet.time)
+            host_index.update(src_ip, dst_ip, dport, flag, now)
+            host_features = host_index.features(dst_ip, dport, now)
+        
         # Create a record for this packet
         record = {
             "duration": round(elapsed, 4),
@@ -158,69 +240,153 @@ def process_packet(packet):
             "src_port": sport,
             "dst_port": dport
         }
+        record.update(host_features)
         
-        packet_data.append(record)
+        packet_data.put(record, backpressure.flow_key(src_ip, dst_ip, sport, dport))
         packet_count += 1
         
         # Print progress
         if packet_count % 10 == 0:
             sys.stdout.write(f"\rCaptured {packet_count} packets... ({int(elapsed)}s/{DURATION}s)")
             sys.stdout.flush()
+
+# Capture-stage callback
+def enqueue_packet(packet):
+    """Hands a captured packet to feature extraction without blocking.
     
-    return True
+    When extraction falls behind, the capture queue sheds or degrades
+    packets according to OVERLOAD_POLICY instead of stalling the sniffer.
+    
+    Args:
+        packet: The captured network packet
+    """
+    capture_queue.put(packet, flow_key(packet))
+
+# Feature-extraction stage
+def extraction_worker():
+    """Extracts features from queued packets until capture ends.
+    
+    Once capture has stopped, keeps draining the queue until it is empty
+    or DRAIN_TIMEOUT expires; packets still queued then are counted as
+    dropped so the cycle finishes on time.
+    """
+    while not drain_expired.is_set():
+        entry = capture_queue.get(timeout=0.2)
+        if entry is None:
+            if capture_done.is_set():
+                return
+            continue
+        packet, degraded = entry
+        try:
+            process_packet(packet, header_only=degraded)
+        except Exception as e:
+            overload_stats.increment("extraction", "errors")
+            print(f"\nError processing packet: {e}")
 
 # Save captured data to CSV
 def save_to_csv():
     """Saves the captured packet data to a CSV file.
     
-    Converts the packet_data list to a DataFrame and saves it to the
-    specified output file path.
+    Drains the extracted records into a DataFrame and saves it to the
+    specified output file path, along with the host state and the
+    per-stage overload counters.
     """
-    global packet_data
+    ensure_data_dir()
+    
+    # Persist host state so the next capture and the API continue from it
+    if host_index is not None:
+        host_state.save_state(host_index)
     
-    if not packet_data:
+    # Packets still waiting for extraction are shed
+    if capture_queue is not None:
+        overload_stats.increment("extraction", "dropped_deadline", len(capture_queue.drain()))
+    
+    records = [record for record, _ in packet_data.drain()] if packet_data is not None else []
+    if overload_stats is not None:
+        backpressure.save_stats(overload_stats.snapshot())
+    
+    if not records:
         print("No packets captured.")
         return
     
     # Create DataFrame and save to CSV
-    df = pd.DataFrame(packet_data)
-    ensure_data_dir()
+    df = pd.DataFrame(records)
     df.to_csv(OUTPUT_FILE, index=False)
     
-    print(f"\nSaved {len(packet_data)} packets to {OUTPUT_FILE}")
-
-# Wrapper for prn callback
-def prn_callback_wrapper(packet):
-    """Wrapper for the prn callback to ensure its return value (True/False) is not printed."""
-    process_packet(packet)
-    # Implicitly returns None, Scapy's prn argument is usually for side effects.
+    print(f"\nSaved {len(records)} packets to {OUTPUT_FILE}")
 
 # Main function to start packet capture
-def capture_packets(duration=None):
+def capture_packets(duration=None, policy=None):
     """Starts the packet capture process.
     
+    Capture, feature extraction and the record buffer read by inference
+    are separated by bounded queues, so a slow stage sheds load according
+    to the overload policy instead of stalling or overrunning the cycle.
+    
+    Creating STOP_FILE ends the capture and the drain early; whatever has
+    been extracted is still saved.
+    
     Args:
         duration: Optional override for capture duration in seconds
+        policy: Optional override for the overload policy
     """
-    global DURATION, packet_count, start_time, packet_data
-    
-    # Reset global variables
-    packet_count = 0
-    start_time = None
-    packet_data = []
+    global DURATION, OVERLOAD_POLICY, packet_count, start_time, packet_data, host_index, capture_queue, overload_stats
     
-    # Override duration if specified
+    # Override duration and policy if specified
     if duration is not None:
         DURATION = duration
+    if policy is not None:
+        OVERLOAD_POLICY = policy
     
-    # Register signal handler
+    # Reset global variables
+    packet_count = 0
+    start_time = time.time()
+    host_index = host_state.load_state()
+    overload_stats = backpressure.OverloadStats()
+    capture_queue = backpressure.BoundedQueue(CAPTURE_QUEUE_SIZE, OVERLOAD_POLICY, "capture", overload_stats)
+    # Records are already extracted, so header_only has nothing left to skip for them
+    record_policy = backpressure.DROP_OLDEST if OVERLOAD_POLICY == backpressure.HEADER_ONLY else OVERLOAD_POLICY
+    packet_data = backpressure.BoundedQueue(MAX_RECORDS, record_policy, "extraction", overload_stats)
+    capture_done.clear()
+    drain_expired.clear()
+    
+    # Register signal handlers
     signal.signal(signal.SIGINT, signal_handler)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, signal_handler)
+    
+    # Allow the backend to attach the sampling profiler on demand
+    sampling_profiler.serve_profile_requests()
+    
+    # A stop request left over from an earlier capture must not end this one
+    ensure_data_dir()
+    if stop_requested():
+        os.remove(STOP_FILE)
     
-    print(f"Starting packet capture for {DURATION} seconds...")
+    print(f"Starting packet capture for {DURATION} seconds (overload policy: {OVERLOAD_POLICY})...")
     print("Press Ctrl+C to stop early.")
     
-    # Start packet sniffing
-    sniff(prn=prn_callback_wrapper, store=0, stop_filter=lambda p: not process_packet(p))
+    worker = threading.Thread(target=extraction_worker, name="feature-extraction", daemon=True)
+    worker.start()
+    
+    # Start packet sniffing; AsyncSniffer takes no timeout, the capture is ended by stop()
+    sniffer = AsyncSniffer(prn=enqueue_packet, store=0)
+    sniffer.start()
+    if join_unless_stopped(sniffer.thread, DURATION):
+        print("\nStop requested. Saving data...")
+    else:
+        print(f"\nCapture duration ({DURATION}s) reached. Saving data...")
+    if sniffer.running:
+        try:
+            sniffer.stop()
+        except Scapy_Exception:
+            pass  # The sniffing thread exited between the check and stop()
+    capture_done.set()
+    if not stop_requested():
+        join_unless_stopped(worker, DRAIN_TIMEOUT)
+    drain_expired.set()
+    worker.join()
+    save_to_csv()
 
 # Execute if run directly
 if __name__ == "__main__":
@@ -231,4 +397,11 @@ if __name__ == "__main__":
         except ValueError:
             print(f"Invalid duration: {sys.argv[1]}. Using default: {DURATION}s")
     
+    # Allow command-line override of the overload policy
+    if len(sys.argv) > 2:
+        if sys.argv[2] in backpressure.POLICIES:
+            OVERLOAD_POLICY = sys.argv[2]
+        else:
+            print(f"Invalid overload policy: {sys.argv[2]}. Using default: {OVERLOAD_POLICY}")
+    
     capture_packets()
\ No newline at end of file
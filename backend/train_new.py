@@ -2,10 +2,11 @@ import pandas as pd
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
-import joblib
+from model_registry import publish_model_version
+import training_cache
 
-# Load the combined training dataset
-df = pd.read_csv("data/Combined_Train.csv")
+# Define the combined training dataset
+DATA_FILE = "data/Combined_Train.csv"
 
 # Drop irrelevant features
 columns_to_drop = [
@@ -13,7 +14,15 @@ columns_to_drop = [
     'root_shell', 'su_attempted', 'num_root', 'num_file_creations', 'num_shells',
     'num_access_files', 'num_outbound_cmds', 'is_host_login', 'is_guest_login'
 ]
-df = df.drop(columns=[col for col in columns_to_drop if col in df.columns], errors='ignore')
+
+# Everything that shapes the preprocessed matrices; part of the cache key
+PREPROCESSING_CONFIG = {
+    'pipeline': 'train_new',
+    'columns_to_drop': columns_to_drop,
+    'labels': 'binary',
+    'encoding': 'factorize',
+    'scaler': 'standard',
+}
 
 # Convert class to binary (normal/anomaly)
 def convert_to_binary(cls):
@@ -30,19 +39,36 @@ def convert_to_binary(cls):
     else:
         return 1
 
-df['class'] = df['class'].apply(convert_to_binary)
+# Reuse the preprocessed matrices when the data and config are unchanged
+cache_key = training_cache.cache_key([DATA_FILE], PREPROCESSING_CONFIG)
+cached = training_cache.load_entry(cache_key)
+if cached is not None:
+    arrays, artifacts = cached
+    X_scaled, y = arrays['X'], arrays['y']
+    scaler, encoders = artifacts['scaler'], artifacts['encoders']
+else:
+    # Load the combined training dataset
+    df = pd.read_csv(DATA_FILE)
+    df = df.drop(columns=[col for col in columns_to_drop if col in df.columns], errors='ignore')
+
+    df['class'] = df['class'].apply(convert_to_binary)
+
+    # Encode categorical columns, keeping each column's categories for prediction
+    encoders = {}
+    for col in df.select_dtypes(include='object').columns:
+        codes, uniques = pd.factorize(df[col])
+        df[col] = codes
+        encoders[col] = uniques.tolist()
 
-# Encode categorical columns
-for col in df.select_dtypes(include='object').columns:
-    df[col] = pd.factorize(df[col])[0]
+    # Split features and target
+    X = df.drop('class', axis=1)
+    y = df['class'].to_numpy()
 
-# Split features and target
-X = df.drop('class', axis=1)
-y = df['class']
+    # Scale features
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
 
-# Scale features
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+    training_cache.save_entry(cache_key, {'X': X_scaled, 'y': y}, {'scaler': scaler, 'encoders': encoders})
 
 # Split data
 X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
@@ -64,10 +90,9 @@ def train_model(X_train, y_train):
 
 model = train_model(X_train, y_train)
 
-# Save model and scaler
-joblib.dump(model, "data/decision_tree_model.pkl")
-joblib.dump(scaler, "data/scaler.pkl")
-
 # Evaluate model
 accuracy = model.score(X_test, y_test)
-print(f"Model accuracy: {accuracy:.4f}")
\ No newline at end of file
+print(f"Model accuracy: {accuracy:.4f}")
+
+# Publish model, scaler and encoders as a new version
+publish_model_version(model, scaler, encoders, {'source': DATA_FILE, 'accuracy': accuracy})
\ No newline at end of file
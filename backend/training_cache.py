@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import numpy as np
+import joblib
+
+# Define the cache directory and its size limit
+CACHE_DIR = "data/cache"
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+# Files inside a cache entry (besides one .npy per array)
+ARTIFACTS_FILE = "artifacts.pkl"
+METADATA_FILE = "metadata.json"
+
+# Compute the cache key of a preprocessing run
+def cache_key(input_paths, config):
+    """Hashes the input files' contents together with the preprocessing config.
+
+    The files are hashed as raw bytes, so a lookup never needs to parse
+    them. Any change to the data or to the config yields a new key.
+
+    Args:
+        input_paths: List of input CSV paths
+        config: JSON-serializable dict describing the preprocessing
+
+    Returns:
+        Hex digest identifying the preprocessed result
+    """
+    digest = hashlib.sha256()
+    for path in input_paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+# Size of a cache entry on disk
+def _entry_size(entry_dir):
+    """Returns the total size in bytes of the files in a cache entry."""
+    return sum(
+        os.path.getsize(os.path.join(entry_dir, name))
+        for name in os.listdir(entry_dir)
+    )
+
+# Unpickle a cache entry's artifacts
+def _load_artifacts(path):
+    """Loads an entry's pickled artifacts.
+
+    Unpickling can fail with almost any exception (a module or class
+    renamed by a library upgrade, a truncated file...); all of them are
+    reported as pickle.UnpicklingError.
+
+    Args:
+        path: Path of the artifacts file
+
+    Returns:
+        Dict of artifacts
+
+    Raises:
+        pickle.UnpicklingError: If the file cannot be unpickled
+    """
+    try:
+        return joblib.load(path)
+    except OSError:
+        raise
+    except Exception as e:
+        raise pickle.UnpicklingError(f"Cannot load {path}: {e}") from e
+
+# Load a cached preprocessing result
+def load_entry(key, cache_dir=CACHE_DIR):
+    """Loads a cached preprocessing result and marks it as recently used.
+
+    An entry that exists but cannot be loaded (missing array, corrupt
+    metadata, artifacts pickled by an incompatible library version) is
+    deleted, so the next save_entry replaces it instead of keeping it.
+
+    Args:
+        key: Key returned by cache_key
+        cache_dir: Cache directory
+
+    Returns:
+        Tuple (arrays, artifacts): dict of numpy arrays and dict of pickled
+        objects (scaler, encoders...), or None on a cache miss
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    if not os.path.isdir(entry_dir):
+        return None
+    try:
+        with open(os.path.join(entry_dir, METADATA_FILE)) as f:
+            metadata = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(entry_dir, f"{name}.npy"), allow_pickle=False)
+            for name in metadata["arrays"]
+        }
+        artifacts = _load_artifacts(os.path.join(entry_dir, ARTIFACTS_FILE))
+    except (OSError, ValueError, KeyError, TypeError, EOFError, pickle.UnpicklingError):
+        print(f"Discarding unreadable cache entry ({key[:12]})")
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+    # The entry directory's mtime records its last use for LRU eviction
+    os.utime(entry_dir)
+    print(f"Loaded preprocessed data from cache ({key[:12]})")
+    return arrays, artifacts
+
+# Store a preprocessing result
+def save_entry(key, arrays, artifacts=None, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Saves a preprocessing result and evicts least recently used entries.
+
+    The entry is written to a staging directory and renamed into place, so
+    a concurrent run never loads a partial entry.
+
+    Args:
+        key: Key returned by cache_key
+        arrays: Dict of name -> numpy array (features, labels...)
+        artifacts: Optional dict of picklable objects (scaler, encoders...)
+        cache_dir: Cache directory
+        max_bytes: Total size the cache is trimmed to
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_dir = os.path.join(cache_dir, key)
+    if os.path.isdir(entry_dir):
+        os.utime(entry_dir)
+        return
+
+    staging_dir = os.path.join(cache_dir, f".{key}.{os.getpid()}.staging")
+    os.makedirs(staging_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(staging_dir, f"{name}.npy"), np.asarray(array), allow_pickle=False)
+    joblib.dump(artifacts or {}, os.path.join(staging_dir, ARTIFACTS_FILE))
+    with open(os.path.join(staging_dir, METADATA_FILE), "w") as f:
+        json.dump({"arrays": list(arrays), "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+    try:
+        os.rename(staging_dir, entry_dir)
+    except OSError:
+        # Another run stored the same entry first
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    print(f"Saved preprocessed data to cache ({key[:12]})")
+    evict(cache_dir, max_bytes)
+
+# Trim the cache to its size limit
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Deletes least recently used entries until the cache fits max_bytes.
+
+    Args:
+        cache_dir: Cache directory
+        max_bytes: Maximum total size in bytes
+
+    Returns:
+        List of evicted keys
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, name)
+        if name.startswith(".") or not os.path.isdir(entry_dir):
+            continue
+        entries.append((os.path.getmtime(entry_dir), _entry_size(entry_dir), name))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = []
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
+        evicted.append(name)
+    return evicted